@@ -109,6 +109,13 @@ def create_table(conn):
             """
             
             cursor.execute(create_table_sql)
+            
+            # Keyset pagination index for the app's Document Registry:
+            # ORDER BY upload_date DESC, document_id DESC
+            cursor.execute(f"""
+            CREATE INDEX {TABLE}_upload_date_idx
+            ON {SCHEMA}.{TABLE} (upload_date DESC, document_id DESC)
+            """)
             conn.commit()
             print(f"✓ Table {SCHEMA}.{TABLE} created successfully")
             
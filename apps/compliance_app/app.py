@@ -11,10 +11,16 @@ from databricks.sdk import WorkspaceClient
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import psycopg2
+import os
+import threading
+import time
 import uuid
 
+from lakebase_pool import LakebasePool
+from result_cache import ResultCache
+
 # Initialize Databricks client
 w = WorkspaceClient()
 
@@ -26,6 +32,21 @@ TABLE = "document_registry"       # Table name
 POSTGRES_USER = "06c27421-2fda-44bc-8891-bd83bb09e08c"  # Update with your Service principal ID for Databricks App
 TABLE_FULL_NAME = f"{SCHEMA}.{TABLE}"
 
+# Connection pool shared by all user sessions
+POOL_MIN_SIZE = 2
+POOL_MAX_SIZE = 10
+TOKEN_REFRESH_MARGIN_S = 300   # refresh the OAuth token this long before it expires
+TOKEN_FALLBACK_TTL_S = 3600    # assumed token lifetime if the credential has no expiration time
+
+# Query results shared by all user sessions, keyed on the normalized filters
+RESULT_CACHE_TTL_S = 300
+RESULT_CACHE_MAX_MB = 256
+
+# Document Registry paging, and the volume that full exports are streamed to
+DOCS_PAGE_SIZES = [25, 50, 100, 250]
+EXPORT_VOLUME_PATH = "/Volumes/main/compliance/exports"  # Update with a volume the app's service principal can write to
+EXPORT_CHUNK_BYTES = 1024 * 1024
+
 # Page configuration
 st.set_page_config(
     page_title="Document Compliance Dashboard",
@@ -57,48 +78,190 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_resource
-def get_lakebase_connection():
-    """Get a cached connection to the Lakebase PostgreSQL instance"""
+def generate_credential():
+    """Generate a Lakebase OAuth token; returns (token, expires_at as a Unix timestamp)"""
+    cred = w.database.generate_database_credential(
+        request_id=str(uuid.uuid4()),
+        instance_names=[INSTANCE_NAME]
+    )
     try:
-        # Get the Lakebase instance details
-        instance = w.database.get_database_instance(name=INSTANCE_NAME)
-        
-        # Generate OAuth credential for authentication
-        cred = w.database.generate_database_credential(
-            request_id=str(uuid.uuid4()), 
-            instance_names=[INSTANCE_NAME]
-        )
-        
-        # Connect to PostgreSQL using psycopg2
-        conn = psycopg2.connect(
+        expires_at = datetime.fromisoformat(cred.expiration_time.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, TypeError, ValueError):
+        expires_at = time.time() + TOKEN_FALLBACK_TTL_S
+    return cred.token, expires_at
+
+@st.cache_resource
+def get_lakebase_pool():
+    """Get the connection pool to the Lakebase PostgreSQL instance, shared by all sessions"""
+    # Get the Lakebase instance details
+    instance = w.database.get_database_instance(name=INSTANCE_NAME)
+
+    # New connections authenticate with the pool's current OAuth token,
+    # which is refreshed in the background before it expires
+    return LakebasePool(
+        connect_kwargs=dict(
             host=instance.read_write_dns,
             dbname=DATABASE,
             user=POSTGRES_USER,
-            password=cred.token,
             sslmode="require",
             port=5432
-        )
-        
-        return conn
-    except Exception as e:
-        st.error(f"Error connecting to Lakebase: {str(e)}")
-        return None
+        ),
+        credential=generate_credential,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+        refresh_margin_s=TOKEN_REFRESH_MARGIN_S
+    )
+
+@st.cache_resource
+def get_result_cache():
+    """Get the query result cache shared by all sessions"""
+    return ResultCache(ttl_s=RESULT_CACHE_TTL_S, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+@st.cache_resource
+def get_query_executor():
+    """Get the thread pool that runs independent queries concurrently, one per pooled connection"""
+    return ThreadPoolExecutor(max_workers=POOL_MAX_SIZE, thread_name_prefix="lakebase-query")
 
-def execute_query(query):
-    """Execute SQL query against Lakebase and return DataFrame"""
+def fetch_result(pool, cache, query, cache_key=None, params=None):
+    """Execute SQL query on a pooled connection, from the result cache when cache_key is given"""
+    def run_query():
+        with pool.connection() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+    if cache_key is None:
+        return run_query()
+    return cache.get_or_compute(cache_key, run_query)
+
+def execute_query(query, cache_key=None, params=None):
+    """Execute SQL query against Lakebase and return DataFrame, from the result cache when cache_key is given"""
     try:
-        conn = get_lakebase_connection()
-        if conn is None:
-            return pd.DataFrame()
-        
-        # Execute query and return as DataFrame
-        df = pd.read_sql_query(query, conn)
-        return df
+        # A failed pool creation or query is not cached, so the next rerun tries again
+        return fetch_result(get_lakebase_pool(), get_result_cache(), query, cache_key, params)
     except Exception as e:
         st.error(f"Query error: {str(e)}")
         return pd.DataFrame()
 
+def execute_queries(queries):
+    """Run independent queries concurrently: {name: (query, cache_key[, params])} -> {name: DataFrame}"""
+    try:
+        pool, cache = get_lakebase_pool(), get_result_cache()
+    except Exception as e:
+        st.error(f"Query error: {str(e)}")
+        return {name: pd.DataFrame() for name in queries}
+    # Worker threads have no Streamlit context: errors are reported from here
+    futures = {name: get_query_executor().submit(fetch_result, pool, cache, *spec)
+               for name, spec in queries.items()}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            st.error(f"Query error: {str(e)}")
+            results[name] = pd.DataFrame()
+    return results
+
+def export_to_volume(query, params, path):
+    """Stream the result of query as CSV from PostgreSQL into a volume file; returns the row count"""
+    # COPY ... TO STDOUT writes into one end of a pipe while the Files API
+    # uploads from the other, so memory use does not grow with the result.
+    result = {}
+    try:
+        with get_lakebase_pool().connection() as conn:
+            with conn.cursor() as cur:
+                copy_sql = f"COPY ({cur.mogrify(query, params).decode()}) TO STDOUT WITH (FORMAT csv, HEADER)"
+            read_fd, write_fd = os.pipe()
+
+            def produce():
+                try:
+                    with os.fdopen(write_fd, "wb", buffering=EXPORT_CHUNK_BYTES) as sink, conn.cursor() as cur:
+                        cur.copy_expert(copy_sql, sink, size=EXPORT_CHUNK_BYTES)
+                        result["rows"] = cur.rowcount
+                except Exception as e:
+                    result["error"] = e
+
+            producer = threading.Thread(target=produce, name="registry-export", daemon=True)
+            producer.start()
+            try:
+                # Closing the read end on a failed upload stops COPY with a broken pipe
+                with os.fdopen(read_fd, "rb", buffering=EXPORT_CHUNK_BYTES) as source:
+                    w.files.upload(path, source, overwrite=True)
+            finally:
+                producer.join()
+        if "error" in result:
+            raise result["error"]
+    except Exception:
+        # Either side failed: do not leave a partial export behind
+        try:
+            w.files.delete(path)
+        except Exception:
+            pass  # the upload never created the file
+        raise
+    return result["rows"]
+
+# Every Overview and Analytics chart is a slice of one GROUPING SETS query:
+# slice name -> grouping columns
+AGGREGATE_SLICES = {
+    "kpi": [],
+    "business_unit": ["business_unit"],
+    "compliance_status": ["compliance_status"],
+    "classification": ["classification"],
+    "month": ["month"],
+    "document_type": ["document_type"],
+    "retention": ["retention_period_years"],
+    "owner": ["owner_name", "business_unit"],
+}
+AGGREGATE_COLUMNS = ["business_unit", "compliance_status", "classification", "month",
+                     "document_type", "retention_period_years", "owner_name"]
+
+def grouping_id(columns):
+    """GROUPING(...) over AGGREGATE_COLUMNS for a set grouped by columns: a bit is set per rolled-up column"""
+    n = len(AGGREGATE_COLUMNS)
+    return sum(1 << (n - 1 - i) for i, c in enumerate(AGGREGATE_COLUMNS) if c not in columns)
+
+def load_aggregates(where_clause, cache_key):
+    """Compute all dashboard aggregates in a single scan; returns {slice name: DataFrame}"""
+    grouping_sets = ", ".join(f"({', '.join(cols)})" for cols in AGGREGATE_SLICES.values())
+    # No DISTINCT aggregates, so PostgreSQL can hash every grouping set in one
+    # pass: document_id is the primary key, and the number of business units is
+    # the size of the business_unit slice.
+    agg_query = f"""
+    SELECT
+        GROUPING({', '.join(AGGREGATE_COLUMNS)}) as grouping_id,
+        {', '.join(AGGREGATE_COLUMNS)},
+        COUNT(*) as doc_count,
+        SUM(file_size_mb) as total_size_mb,
+        AVG(file_size_mb) as avg_size,
+        COUNT(CASE WHEN marked_for_archival THEN 1 END) as archival_pending,
+        COUNT(CASE WHEN compliance_status = 'Non-Compliant' THEN 1 END) as non_compliant,
+        COUNT(CASE WHEN review_required AND next_review_date <= CURRENT_DATE + INTERVAL '30 days' THEN 1 END) as reviews_due_soon,
+        COUNT(CASE WHEN classification IN ('Confidential', 'Highly Confidential') THEN 1 END) as sensitive_docs
+    FROM (
+        SELECT *, DATE_TRUNC('month', upload_date) as month
+        FROM {TABLE_FULL_NAME}
+        WHERE {where_clause}
+    ) filtered
+    GROUP BY GROUPING SETS ({grouping_sets})
+    """
+    agg_df = execute_query(agg_query, cache_key=("aggregates",) + cache_key)
+    if agg_df.empty:
+        return {name: pd.DataFrame() for name in AGGREGATE_SLICES}
+
+    slices = {}
+    for name, cols in AGGREGATE_SLICES.items():
+        part = agg_df[agg_df['grouping_id'] == grouping_id(cols)]
+        slices[name] = part[cols + [c for c in agg_df.columns if c not in AGGREGATE_COLUMNS + ['grouping_id']]] \
+            .reset_index(drop=True)
+
+    # Grouping columns come back as floats where other sets left them NULL
+    slices["retention"]['retention_period_years'] = slices["retention"]['retention_period_years'].astype(int)
+
+    # An empty filter result still has a kpi row (the () set) with zero counts
+    kpi = slices["kpi"]
+    kpi = kpi.rename(columns={'doc_count': 'total_documents', 'total_size_mb': 'total_storage_mb'})
+    kpi['active_business_units'] = slices["business_unit"]['business_unit'].notna().sum()
+    kpi['total_storage_mb'] = kpi['total_storage_mb'].fillna(0)
+    slices["kpi"] = kpi
+    return slices
+
 # Header
 col1, col2 = st.columns([4, 1])
 with col1:
@@ -130,7 +293,7 @@ with st.sidebar:
     FROM {TABLE_FULL_NAME} 
     ORDER BY business_unit
     """
-    bu_df = execute_query(business_units_query)
+    bu_df = execute_query(business_units_query, cache_key=("business_units",))
     
     all_business_units = ["All"] + (bu_df['business_unit'].tolist() if not bu_df.empty else [])
     selected_bu = st.multiselect(
@@ -159,8 +322,9 @@ with st.sidebar:
     
     st.divider()
     
-    # Refresh button
-    refresh_data = st.button("🔄 Refresh Data", type="primary", use_container_width=True)
+    # Refresh button: clears the cached results of every session before the rerun
+    refresh_data = st.button("🔄 Refresh Data", type="primary", use_container_width=True,
+                             on_click=lambda: get_result_cache().invalidate())
 
 # Build WHERE clause based on filters
 where_clauses = [f"upload_date >= CURRENT_DATE - INTERVAL '{days_back} days'"]
@@ -185,25 +349,21 @@ if show_review_required:
 
 where_clause = " AND ".join(where_clauses)
 
-# Main content
-tab1, tab2, tab3, tab4 = st.tabs(["📊 Overview", "📄 Documents", "📈 Analytics", "⚠️ Compliance Alerts"])
+# Normalized filters: the same selection in any order hits the same cached results
+filter_key = (
+    days_back,
+    tuple(sorted(selected_bu)) if "All" not in selected_bu and selected_bu else ("All",),
+    tuple(sorted(compliance_status_filter)),
+    tuple(sorted(classification_filter)),
+    show_archival_only,
+    show_review_required,
+)
 
-with tab1:
+# Main content
+def render_overview():
     # KPI Metrics
-    kpi_query = f"""
-    SELECT 
-        COUNT(DISTINCT document_id) as total_documents,
-        COUNT(DISTINCT business_unit) as active_business_units,
-        SUM(file_size_mb) as total_storage_mb,
-        COUNT(CASE WHEN marked_for_archival THEN 1 END) as archival_pending,
-        COUNT(CASE WHEN compliance_status = 'Non-Compliant' THEN 1 END) as non_compliant,
-        COUNT(CASE WHEN review_required AND next_review_date <= CURRENT_DATE + INTERVAL '30 days' THEN 1 END) as reviews_due_soon,
-        COUNT(CASE WHEN classification IN ('Confidential', 'Highly Confidential') THEN 1 END) as sensitive_docs
-    FROM {TABLE_FULL_NAME}
-    WHERE {where_clause}
-    """
-    
-    kpi_df = execute_query(kpi_query)
+    aggregates = load_aggregates(where_clause, filter_key)
+    kpi_df = aggregates["kpi"]
     
     if not kpi_df.empty:
         st.subheader("📊 Key Metrics")
@@ -270,17 +430,7 @@ with tab1:
         
         with col1:
             # Documents by business unit
-            bu_query = f"""
-            SELECT 
-                business_unit,
-                COUNT(*) as doc_count,
-                SUM(file_size_mb) as total_size_mb
-            FROM {TABLE_FULL_NAME}
-            WHERE {where_clause}
-            GROUP BY business_unit
-            ORDER BY doc_count DESC
-            """
-            bu_df = execute_query(bu_query)
+            bu_df = aggregates["business_unit"].sort_values('doc_count', ascending=False)
             
             if not bu_df.empty:
                 st.subheader("📁 Documents by Business Unit")
@@ -298,16 +448,9 @@ with tab1:
         
         with col2:
             # Compliance status distribution
-            compliance_query = f"""
-            SELECT 
-                compliance_status,
-                COUNT(*) as count
-            FROM {TABLE_FULL_NAME}
-            WHERE {where_clause}
-            GROUP BY compliance_status
-            ORDER BY count DESC
-            """
-            compliance_df = execute_query(compliance_query)
+            compliance_df = (aggregates["compliance_status"]
+                             .rename(columns={'doc_count': 'count'})
+                             .sort_values('count', ascending=False))
             
             if not compliance_df.empty:
                 st.subheader("✅ Compliance Status Distribution")
@@ -334,22 +477,11 @@ with tab1:
         
         with col1:
             # Documents by classification
-            class_query = f"""
-            SELECT 
-                classification,
-                COUNT(*) as count
-            FROM {TABLE_FULL_NAME}
-            WHERE {where_clause}
-            GROUP BY classification
-            ORDER BY 
-                CASE classification
-                    WHEN 'Highly Confidential' THEN 1
-                    WHEN 'Confidential' THEN 2
-                    WHEN 'Internal' THEN 3
-                    WHEN 'Public' THEN 4
-                END
-            """
-            class_df = execute_query(class_query)
+            classification_order = ['Highly Confidential', 'Confidential', 'Internal', 'Public']
+            class_df = (aggregates["classification"]
+                        .rename(columns={'doc_count': 'count'})
+                        .sort_values('classification', key=lambda c: c.map(
+                            {name: i for i, name in enumerate(classification_order)})))
             
             if not class_df.empty:
                 st.subheader("🔒 Documents by Classification")
@@ -370,17 +502,7 @@ with tab1:
         
         with col2:
             # Upload trend
-            trend_query = f"""
-            SELECT 
-                DATE_TRUNC('month', upload_date) as month,
-                COUNT(*) as doc_count
-            FROM {TABLE_FULL_NAME}
-            WHERE {where_clause}
-            GROUP BY DATE_TRUNC('month', upload_date)
-            ORDER BY month DESC
-            LIMIT 12
-            """
-            trend_df = execute_query(trend_query)
+            trend_df = aggregates["month"].sort_values('month', ascending=False).head(12)
             
             if not trend_df.empty:
                 st.subheader("📈 Upload Trend (Last 12 Months)")
@@ -393,15 +515,45 @@ with tab1:
                 )
                 st.plotly_chart(fig4, use_container_width=True)
 
-with tab2:
+def registry_pages_reset():
+    """Go back to the first page of the Document Registry"""
+    st.session_state.docs_cursors = []
+
+def registry_page_next():
+    st.session_state.docs_cursors.append(st.session_state.docs_next_cursor)
+
+def registry_page_previous():
+    st.session_state.docs_cursors.pop()
+
+def render_documents():
     st.subheader("📄 Document Registry")
     
     # Search functionality
-    search_term = st.text_input("🔍 Search documents", placeholder="Enter document name, owner, or type...")
+    search_term = st.text_input("🔍 Search documents", placeholder="Enter document name, owner, or type...").strip()
+    page_size = st.selectbox("Rows per page", DOCS_PAGE_SIZES, index=1)
+    
+    docs_where = where_clause
+    search_params = {}
+    if search_term:
+        docs_where += " AND (LOWER(document_name) LIKE LOWER(%(search)s) OR LOWER(owner_name) LIKE LOWER(%(search)s) OR LOWER(document_type) LIKE LOWER(%(search)s))"
+        search_params["search"] = f"%{search_term}%"
+    search_key = filter_key + (search_term.lower(),)
+    
+    # Keyset pagination on (upload_date, document_id): docs_cursors holds the
+    # key of the last row of every page before the current one. Changing the
+    # filters, search or page size starts over from the first page.
+    if st.session_state.get("docs_nav_key") != search_key + (page_size,):
+        st.session_state.docs_nav_key = search_key + (page_size,)
+        registry_pages_reset()
+    cursors = st.session_state.docs_cursors
+    page_where = docs_where
+    params = dict(search_params)
+    if cursors:
+        page_where += " AND (upload_date, document_id) < (%(after_date)s, %(after_id)s)"
+        params["after_date"], params["after_id"] = cursors[-1]
     
-    # Main documents query
-    docs_query = f"""
-    SELECT 
+    # Main documents query: one row more than a page tells whether there is a next page
+    docs_columns = """
         document_id,
         document_name,
         document_type,
@@ -414,20 +566,30 @@ with tab2:
         marked_for_archival,
         review_required,
         next_review_date,
-        storage_location
-    FROM {TABLE_FULL_NAME}
-    WHERE {where_clause}
-    """
-    
-    if search_term:
-        docs_query += f" AND (LOWER(document_name) LIKE LOWER('%{search_term}%') OR LOWER(owner_name) LIKE LOWER('%{search_term}%') OR LOWER(document_type) LIKE LOWER('%{search_term}%'))"
-    
-    docs_query += " ORDER BY upload_date DESC LIMIT 1000"
-    
-    docs_df = execute_query(docs_query)
+        storage_location"""
+    docs = execute_queries({
+        "page": (f"""
+        SELECT {docs_columns}
+        FROM {TABLE_FULL_NAME}
+        WHERE {page_where}
+        ORDER BY upload_date DESC, document_id DESC
+        LIMIT {page_size + 1}
+        """, ("documents",) + search_key + (page_size, cursors[-1] if cursors else None), params or None),
+        "count": (f"""
+        SELECT COUNT(*) as documents
+        FROM {TABLE_FULL_NAME}
+        WHERE {docs_where}
+        """, ("documents_count",) + search_key, search_params or None),
+    })
+    docs_df = docs["page"].head(page_size)
+    has_next = len(docs["page"]) > page_size
+    total = int(docs["count"]['documents'].iloc[0]) if not docs["count"].empty else 0
     
     if not docs_df.empty:
-        st.info(f"Showing {len(docs_df)} documents")
+        page = len(cursors) + 1
+        pages = max(1, -(-total // page_size))
+        first_row = len(cursors) * page_size + 1
+        st.info(f"Showing documents {first_row:,}-{first_row + len(docs_df) - 1:,} of {total:,}")
         
         # Display dataframe with styling
         st.dataframe(
@@ -446,36 +608,61 @@ with tab2:
             }
         )
         
-        # Export functionality
-        csv = docs_df.to_csv(index=False)
-        st.download_button(
-            label="📥 Export to CSV",
-            data=csv,
-            file_name=f"document_registry_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
-        )
+        # Page navigation
+        last = docs_df.iloc[-1]
+        st.session_state.docs_next_cursor = (last['upload_date'].to_pydatetime(), last['document_id'])
+        col1, col2, col3, col4 = st.columns([1, 1, 2, 1])
+        with col1:
+            st.button("⏮ First", disabled=not cursors, on_click=registry_pages_reset, use_container_width=True)
+        with col2:
+            st.button("◀ Previous", disabled=not cursors, on_click=registry_page_previous, use_container_width=True)
+        with col3:
+            st.markdown(f"<div style='text-align: center'>Page {page:,} of {pages:,}</div>", unsafe_allow_html=True)
+        with col4:
+            st.button("Next ▶", disabled=not has_next, on_click=registry_page_next, use_container_width=True)
+        
+        st.divider()
+        
+        # Export functionality: the current page as a download, or every
+        # matching document streamed from PostgreSQL into a volume
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                label="📥 Export page to CSV",
+                data=docs_df.to_csv(index=False),
+                file_name=f"document_registry_{datetime.now().strftime('%Y%m%d')}_page{page}.csv",
+                mime="text/csv"
+            )
+        with col2:
+            if st.button(f"📦 Export all {total:,} documents to volume"):
+                export_path = f"{EXPORT_VOLUME_PATH}/document_registry_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+                export_query = f"""
+                SELECT {docs_columns}
+                FROM {TABLE_FULL_NAME}
+                WHERE {docs_where}
+                ORDER BY upload_date DESC, document_id DESC
+                """
+                try:
+                    with st.spinner("Exporting..."):
+                        rows = export_to_volume(export_query, search_params or None, export_path)
+                    st.success(f"Exported {rows:,} documents to `{export_path}`")
+                except Exception as e:
+                    st.error(f"Export error: {str(e)}")
     else:
         st.warning("No documents found matching the criteria")
 
-with tab3:
+def render_analytics():
     st.subheader("📈 Advanced Analytics")
+    aggregates = load_aggregates(where_clause, filter_key)
     
     col1, col2 = st.columns(2)
     
     with col1:
         # Document types distribution
-        doc_type_query = f"""
-        SELECT 
-            document_type,
-            COUNT(*) as count,
-            AVG(file_size_mb) as avg_size
-        FROM {TABLE_FULL_NAME}
-        WHERE {where_clause}
-        GROUP BY document_type
-        ORDER BY count DESC
-        LIMIT 10
-        """
-        doc_type_df = execute_query(doc_type_query)
+        doc_type_df = (aggregates["document_type"]
+                       .rename(columns={'doc_count': 'count'})
+                       .sort_values('count', ascending=False)
+                       .head(10)[['document_type', 'count', 'avg_size']])
         
         if not doc_type_df.empty:
             st.markdown("**Document Types**")
@@ -492,16 +679,9 @@ with tab3:
     
     with col2:
         # Retention period distribution
-        retention_query = f"""
-        SELECT 
-            retention_period_years,
-            COUNT(*) as count
-        FROM {TABLE_FULL_NAME}
-        WHERE {where_clause}
-        GROUP BY retention_period_years
-        ORDER BY retention_period_years
-        """
-        retention_df = execute_query(retention_query)
+        retention_df = (aggregates["retention"]
+                        .rename(columns={'doc_count': 'count'})
+                        .sort_values('retention_period_years')[['retention_period_years', 'count']])
         
         if not retention_df.empty:
             st.markdown("**Retention Period Distribution**")
@@ -516,34 +696,22 @@ with tab3:
     
     # Owner statistics
     st.divider()
-    owner_query = f"""
-    SELECT 
-        owner_name,
-        business_unit,
-        COUNT(*) as doc_count,
-        SUM(file_size_mb) as total_size_mb,
-        COUNT(CASE WHEN compliance_status = 'Non-Compliant' THEN 1 END) as non_compliant_count
-    FROM {TABLE_FULL_NAME}
-    WHERE {where_clause}
-    GROUP BY owner_name, business_unit
-    ORDER BY doc_count DESC
-    LIMIT 20
-    """
-    owner_df = execute_query(owner_query)
+    owner_df = (aggregates["owner"]
+                .rename(columns={'non_compliant': 'non_compliant_count'})
+                .sort_values('doc_count', ascending=False)
+                .head(20)[['owner_name', 'business_unit', 'doc_count', 'total_size_mb', 'non_compliant_count']]
+                .reset_index(drop=True))
     
     if not owner_df.empty:
         st.markdown("**Top Document Owners**")
         st.dataframe(owner_df, use_container_width=True)
 
-with tab4:
+def render_alerts():
     st.subheader("⚠️ Compliance Alerts & Action Items")
-    
-    # Critical alerts
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("#### 🚨 Non-Compliant Documents")
-        non_compliant_query = f"""
+
+    # The three alert lists are independent: fetch them concurrently
+    alerts = execute_queries({
+        "non_compliant": (f"""
         SELECT 
             document_id,
             document_name,
@@ -556,18 +724,8 @@ with tab4:
             AND {where_clause}
         ORDER BY upload_date DESC
         LIMIT 50
-        """
-        non_compliant_df = execute_query(non_compliant_query)
-        
-        if not non_compliant_df.empty:
-            st.error(f"⚠️ {len(non_compliant_df)} non-compliant documents require immediate attention")
-            st.dataframe(non_compliant_df, use_container_width=True, height=300)
-        else:
-            st.success("✅ No non-compliant documents found")
-    
-    with col2:
-        st.markdown("#### 📅 Reviews Due Soon")
-        review_due_query = f"""
+        """, ("non_compliant",) + filter_key),
+        "reviews_due": (f"""
         SELECT 
             document_id,
             document_name,
@@ -580,8 +738,41 @@ with tab4:
             AND {where_clause}
         ORDER BY next_review_date ASC
         LIMIT 50
-        """
-        review_due_df = execute_query(review_due_query)
+        """, ("reviews_due",) + filter_key),
+        "archival": (f"""
+        SELECT 
+            document_id,
+            document_name,
+            business_unit,
+            owner_name,
+            upload_date,
+            archival_date,
+            file_size_mb
+        FROM {TABLE_FULL_NAME}
+        WHERE marked_for_archival = true
+            AND archival_date <= CURRENT_DATE + INTERVAL '90 days'
+            AND {where_clause}
+        ORDER BY archival_date ASC
+        LIMIT 100
+        """, ("archival",) + filter_key),
+    })
+    
+    # Critical alerts
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("#### 🚨 Non-Compliant Documents")
+        non_compliant_df = alerts["non_compliant"]
+        
+        if not non_compliant_df.empty:
+            st.error(f"⚠️ {len(non_compliant_df)} non-compliant documents require immediate attention")
+            st.dataframe(non_compliant_df, use_container_width=True, height=300)
+        else:
+            st.success("✅ No non-compliant documents found")
+    
+    with col2:
+        st.markdown("#### 📅 Reviews Due Soon")
+        review_due_df = alerts["reviews_due"]
         
         if not review_due_df.empty:
             st.warning(f"📋 {len(review_due_df)} documents require review in the next 30 days")
@@ -593,23 +784,7 @@ with tab4:
     
     # Archival pending
     st.markdown("#### 🗄️ Documents Pending Archival")
-    archival_query = f"""
-    SELECT 
-        document_id,
-        document_name,
-        business_unit,
-        owner_name,
-        upload_date,
-        archival_date,
-        file_size_mb
-    FROM {TABLE_FULL_NAME}
-    WHERE marked_for_archival = true
-        AND archival_date <= CURRENT_DATE + INTERVAL '90 days'
-        AND {where_clause}
-    ORDER BY archival_date ASC
-    LIMIT 100
-    """
-    archival_df = execute_query(archival_query)
+    archival_df = alerts["archival"]
     
     if not archival_df.empty:
         st.info(f"📦 {len(archival_df)} documents scheduled for archival in the next 90 days")
@@ -617,7 +792,23 @@ with tab4:
     else:
         st.info("No documents scheduled for archival in the next 90 days")
 
+# Only the selected view runs its queries. st.tabs would render (and query)
+# all four on every rerun.
+VIEWS = {
+    "📊 Overview": render_overview,
+    "📄 Documents": render_documents,
+    "📈 Analytics": render_analytics,
+    "⚠️ Compliance Alerts": render_alerts,
+}
+selected_view = st.radio("View", list(VIEWS), horizontal=True, label_visibility="collapsed", key="view")
+VIEWS[selected_view]()
+
 # Footer
 st.divider()
 st.caption(f"🔐 Data sourced from: {TABLE_FULL_NAME} (Lakebase) | Last refreshed: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Powered by Databricks Lakebase")
+cache_status = get_result_cache().status()
+st.caption(f"⚡ Query cache (all sessions): {cache_status['hit_rate']:.0%} hit rate "
+           f"({cache_status['hits']:,} hits, {cache_status['misses']:,} misses) | "
+           f"{cache_status['entries']} results, {cache_status['mb']:.1f} of {RESULT_CACHE_MAX_MB} MB | "
+           f"TTL {RESULT_CACHE_TTL_S}s | {cache_status['evictions']:,} evicted")
 
@@ -0,0 +1,216 @@
+"""
+Load test for the Lakebase connection pool against a local PostgreSQL.
+
+Simulates many concurrent app sessions, each rerunning the dashboard's query
+mix, once through a single shared connection (how the app used to connect) and
+once through LakebasePool. Both log in as a dedicated role whose password
+stands in for the Lakebase OAuth token: every credential request sets a new
+password with ALTER ROLE, so any connection opened with a stale one is
+rejected. Credentials expire every few seconds, so the pool rotates its token
+and recycles connections many times during the run; the test fails if any
+query errors.
+
+The server must check passwords for that role, e.g. with this line at the top
+of pg_hba.conf (the test refuses to run otherwise):
+
+    host  all  loadtest_app  127.0.0.1/32  scram-sha-256
+
+    python benchmarks/pool_load_test.py --dsn "host=localhost dbname=postgres user=postgres" \\
+        --password postgres --sessions 50 --reruns 20
+"""
+
+import argparse
+import os
+import secrets
+import statistics
+import sys
+import threading
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from lakebase_pool import LakebasePool  # noqa: E402
+
+SCHEMA = "audit_loadtest"
+TABLE = f"{SCHEMA}.document_registry"
+APP_ROLE = "loadtest_app"
+
+# One dashboard rerun: the filter list, KPIs and the Overview charts
+RERUN_QUERIES = [
+    f"SELECT DISTINCT business_unit FROM {TABLE} ORDER BY business_unit",
+    f"""SELECT COUNT(DISTINCT document_id), COUNT(DISTINCT business_unit), SUM(file_size_mb),
+               COUNT(CASE WHEN compliance_status = 'Non-Compliant' THEN 1 END)
+        FROM {TABLE} WHERE upload_date >= CURRENT_DATE - INTERVAL '365 days'""",
+    f"SELECT business_unit, COUNT(*), SUM(file_size_mb) FROM {TABLE} GROUP BY business_unit",
+    f"SELECT compliance_status, COUNT(*) FROM {TABLE} GROUP BY compliance_status",
+    f"SELECT classification, COUNT(*) FROM {TABLE} GROUP BY classification",
+    f"SELECT DATE_TRUNC('month', upload_date), COUNT(*) FROM {TABLE} GROUP BY 1 ORDER BY 1 DESC LIMIT 12",
+]
+
+
+def seed(connect_kwargs, password, rows):
+    """Create and fill the load test table"""
+    conn = psycopg2.connect(password=password, **connect_kwargs)
+    with conn, conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
+        cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cur.execute(f"""
+        CREATE TABLE {TABLE} AS
+        SELECT 'DOC-' || g AS document_id,
+               (ARRAY['Retail Banking','Corporate Banking','Treasury','Legal','Compliance','Operations'])[1 + g % 6] AS business_unit,
+               (ARRAY['Compliant','Non-Compliant','Pending Review','Under Investigation'])[1 + g % 4] AS compliance_status,
+               (ARRAY['Public','Internal','Confidential','Highly Confidential'])[1 + g % 4] AS classification,
+               CURRENT_DATE - (g % 730) * INTERVAL '1 day' AS upload_date,
+               ((g % 500) / 10.0)::DECIMAL(10,2) AS file_size_mb
+        FROM generate_series(1, {int(rows)}) AS g
+        """)
+        cur.execute("SELECT 1 FROM pg_roles WHERE rolname = %s", (APP_ROLE,))
+        if not cur.fetchone():
+            cur.execute(f"CREATE ROLE {APP_ROLE} LOGIN")
+        cur.execute(f"GRANT USAGE ON SCHEMA {SCHEMA} TO {APP_ROLE}")
+        cur.execute(f"GRANT SELECT ON {TABLE} TO {APP_ROLE}")
+    conn.close()
+
+
+class RotatingCredential:
+    """Stand-in for generate_database_credential: each call issues a new password and revokes the previous one"""
+
+    def __init__(self, connect_kwargs, password, ttl_s):
+        self.admin = psycopg2.connect(password=password, **connect_kwargs)
+        self.admin.autocommit = True
+        self.ttl_s = ttl_s
+        self.lock = threading.Lock()
+        self.issued = 0
+
+    def __call__(self):
+        token = secrets.token_urlsafe(24)
+        with self.lock, self.admin.cursor() as cur:
+            cur.execute(f"ALTER ROLE {APP_ROLE} PASSWORD %s", (token,))
+            self.issued += 1
+        return token, time.time() + self.ttl_s
+
+    def check_enforced(self, app_kwargs):
+        # A server that accepts any password (trust auth) would make the test meaningless
+        self()
+        try:
+            psycopg2.connect(password="not-the-current-token", **app_kwargs).close()
+        except psycopg2.OperationalError:
+            return
+        sys.exit(f"The server accepted a wrong password for {APP_ROLE}; enable password authentication "
+                 f"for it in pg_hba.conf (see the module docstring)")
+
+    def close(self):
+        self.admin.close()
+
+
+def run_query(conn, query, rtt_s):
+    with conn.cursor() as cur:
+        cur.execute(query)
+        cur.fetchall()
+    # Network round trip to a remote Lakebase instance, spent holding the connection
+    time.sleep(rtt_s)
+
+
+class SharedConnection:
+    """Baseline: one connection serialized across all sessions, never re-authenticated"""
+
+    def __init__(self, connect_kwargs, credential, args):
+        self.conn = psycopg2.connect(password=credential()[0], **connect_kwargs)
+        self.lock = threading.Lock()
+        self.rtt_s = args.rtt_ms / 1000
+
+    def run(self, query):
+        with self.lock:
+            run_query(self.conn, query, self.rtt_s)
+
+    def close(self):
+        self.conn.close()
+
+
+class Pooled:
+    def __init__(self, connect_kwargs, credential, args):
+        self.pool = LakebasePool(connect_kwargs, credential, min_size=args.min_size, max_size=args.max_size,
+                                 refresh_margin_s=args.token_ttl_s / 4, max_lifetime_s=args.token_ttl_s)
+        self.rtt_s = args.rtt_ms / 1000
+
+    def run(self, query):
+        with self.pool.connection() as conn:
+            run_query(conn, query, self.rtt_s)
+
+    def close(self):
+        print(f"  pool: {self.pool.status()}")
+        self.pool.close()
+
+
+def load(target, sessions, reruns):
+    """Run sessions x reruns dashboard reruns concurrently; returns (rerun latencies, errors, wall s)"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def session():
+        for _ in range(reruns):
+            started = time.perf_counter()
+            try:
+                for query in RERUN_QUERIES:
+                    target.run(query)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def report(name, latencies, errors, wall_s):
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    print(f"{name:>7}: {len(latencies) / wall_s:7.1f} reruns/s | p50 {q[49] * 1000:7.1f} ms | "
+          f"p95 {q[94] * 1000:7.1f} ms | {len(errors)} errors | {wall_s:.1f}s")
+    for e in sorted(set(errors))[:5]:
+        print(f"         {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default="host=localhost dbname=postgres user=postgres")
+    parser.add_argument("--password", default=os.environ.get("PGPASSWORD", ""))
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--min-size", type=int, default=2)
+    parser.add_argument("--max-size", type=int, default=10)
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="simulated network round trip per query")
+    parser.add_argument("--token-ttl-s", type=float, default=8.0, help="simulated OAuth token lifetime")
+    args = parser.parse_args()
+
+    connect_kwargs = {"dsn": args.dsn}
+    app_kwargs = {"dsn": args.dsn, "user": APP_ROLE}
+    seed(connect_kwargs, args.password, args.rows)
+    credential = RotatingCredential(connect_kwargs, args.password, args.token_ttl_s)
+    credential.check_enforced(app_kwargs)
+    print(f"{args.sessions} sessions x {args.reruns} reruns x {len(RERUN_QUERIES)} queries on {args.rows:,} rows")
+
+    failed = False
+    for name, make in (("shared", lambda: SharedConnection(app_kwargs, credential, args)),
+                       ("pool", lambda: Pooled(app_kwargs, credential, args))):
+        target = make()
+        issued = credential.issued
+        latencies, errors, wall_s = load(target, args.sessions, args.reruns)
+        report(name, latencies, errors, wall_s)
+        print(f"         {credential.issued - issued} credentials issued during the run")
+        target.close()
+        failed |= name == "pool" and bool(errors)
+    credential.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
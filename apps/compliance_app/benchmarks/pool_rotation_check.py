@@ -0,0 +1,73 @@
+"""
+Checks the token rotation schedule of LakebasePool without a database.
+
+The pool is created with min_size=0, so it never connects; only its
+background rotation thread runs against a mock credential provider. Each
+scenario counts the credential calls over a few seconds:
+
+- tokens that live shorter than refresh_margin_s (100s tokens, the app's
+  300s margin) must not be refreshed in a busy loop
+- a provider that hands out already expired tokens is asked at most once a
+  second
+- ordinary short-lived tokens are refreshed before they expire
+
+    python benchmarks/pool_rotation_check.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from lakebase_pool import LakebasePool  # noqa: E402
+
+
+class MockCredential:
+    """Hands out tokens valid for ttl_s, recording when each was requested"""
+
+    def __init__(self, ttl_s):
+        self.ttl_s = ttl_s
+        self.calls = []  # (requested_at, expires_at)
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        now = time.time()
+        with self.lock:
+            self.calls.append((now, now + self.ttl_s))
+            return f"token-{len(self.calls)}", now + self.ttl_s
+
+
+def run(ttl_s, refresh_margin_s, seconds):
+    credential = MockCredential(ttl_s)
+    pool = LakebasePool({"dsn": "unused"}, credential, min_size=0, refresh_margin_s=refresh_margin_s)
+    time.sleep(seconds)
+    pool.close()
+    with credential.lock:
+        return list(credential.calls)
+
+
+def main():
+    failures = []
+
+    def check(name, ok, detail):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {detail}")
+        if not ok:
+            failures.append(name)
+
+    calls = run(ttl_s=100, refresh_margin_s=300, seconds=3)
+    check("lifetime below margin", len(calls) == 1, f"{len(calls)} credential calls in 3s")
+
+    calls = run(ttl_s=-1, refresh_margin_s=300, seconds=3.5)
+    check("expired tokens", len(calls) <= 5, f"{len(calls)} credential calls in 3.5s")
+
+    calls = run(ttl_s=2, refresh_margin_s=0.5, seconds=5)
+    lapsed = [i for i in range(1, len(calls)) if calls[i][0] >= calls[i - 1][1]]
+    check("short-lived tokens", len(calls) >= 3 and not lapsed,
+          f"{len(calls)} credential calls in 5s, {len(lapsed)} after the previous token expired")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Thread-safe psycopg2 connection pool for Databricks Lakebase.
+
+Lakebase authenticates with short-lived OAuth tokens from
+generate_database_credential. A token is only checked at login, so open
+connections outlive it, but every new connection needs a current one. The pool
+refreshes the token in a background thread before it expires, opens new
+connections with the latest token, and retires connections after
+max_lifetime_s so none of them depends on a token for long.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+import psycopg2
+from psycopg2 import extensions
+
+# Returns (token, expires_at as a Unix timestamp)
+CredentialProvider = Callable[[], Tuple[str, float]]
+
+
+class PoolTimeout(Exception):
+    """No connection became available within checkout_timeout_s"""
+
+
+class LakebasePool:
+    """Bounded pool of psycopg2 connections with background credential rotation"""
+
+    def __init__(self, connect_kwargs: Dict, credential: CredentialProvider,
+                 min_size: int = 2, max_size: int = 10,
+                 refresh_margin_s: float = 300.0, max_lifetime_s: float = 1800.0,
+                 ping_after_idle_s: float = 5.0, checkout_timeout_s: float = 30.0):
+        self.connect_kwargs = connect_kwargs
+        self.credential = credential
+        self.min_size = min_size
+        self.max_size = max_size
+        self.refresh_margin_s = refresh_margin_s
+        self.max_lifetime_s = max_lifetime_s
+        self.ping_after_idle_s = ping_after_idle_s
+        self.checkout_timeout_s = checkout_timeout_s
+        self.stats = {"checkouts": 0, "waits": 0, "opened": 0, "discarded": 0, "token_refreshes": 0,
+                      "refresh_errors": 0}
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, opened_at, returned_at), most recently returned last
+        self._size = 0        # open connections, idle or checked out
+        self._closed = False
+        # Waiting checkouts are served in arrival order, so no session starves
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned = set()
+        self._token, self._token_expires_at = None, 0.0
+        self._refresh_token()
+
+        for _ in range(min_size):
+            conn = self._open()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic(), time.monotonic()))
+
+        self._stop = threading.Event()
+        self._rotator = threading.Thread(target=self._rotate, name="lakebase-token-rotation", daemon=True)
+        self._rotator.start()
+
+    # --- credentials ----------------------------------------------------
+
+    def _refresh_token(self) -> None:
+        token, expires_at = self.credential()
+        with self._cond:
+            self._token, self._token_expires_at = token, expires_at
+            self.stats["token_refreshes"] += 1
+
+    def _rotate(self) -> None:
+        # Refresh refresh_margin_s before expiry; retry sooner after an error
+        # so a transient failure does not let the token lapse. Tokens that live
+        # shorter than the margin are refreshed halfway through their remaining
+        # lifetime, and never more than once a second.
+        while not self._stop.is_set():
+            remaining_s = self._token_expires_at - time.time()
+            wait_s = max(remaining_s - self.refresh_margin_s, remaining_s / 2, 1.0)
+            if self._stop.wait(wait_s):
+                return
+            try:
+                self._refresh_token()
+            except Exception:
+                with self._cond:
+                    self.stats["refresh_errors"] += 1
+                self._stop.wait(min(10.0, max(self._token_expires_at - time.time(), 1.0) / 2))
+                continue
+            self._top_up()
+
+    def _top_up(self) -> None:
+        # Replace expired idle connections and keep min_size open
+        now = time.monotonic()
+        with self._cond:
+            keep = deque()
+            stale = []
+            for item in self._idle:
+                (stale if now - item[1] >= self.max_lifetime_s else keep).append(item)
+            self._idle = keep
+            self._size -= len(stale)
+            missing = max(self.min_size - self._size, 0)
+            self._size += missing
+        for conn, _, _ in stale:
+            self._discard(conn)
+        for _ in range(missing):
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify_all()
+                continue
+            with self._cond:
+                self._idle.append((conn, time.monotonic(), time.monotonic()))
+                self._cond.notify_all()
+
+    # --- connections ----------------------------------------------------
+
+    def _open(self):
+        with self._cond:
+            token = self._token
+        conn = psycopg2.connect(password=token, **self.connect_kwargs)
+        with self._cond:
+            self.stats["opened"] += 1
+        return conn
+
+    def _discard(self, conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self.stats["discarded"] += 1
+
+    def _healthy(self, conn, returned_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.ping_after_idle_s:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _skip_ticket(self, ticket: int) -> None:
+        # A waiter that gave up must not hold up the ones behind it
+        if ticket == self._serving:
+            self._serving += 1
+            self._advance()
+        else:
+            self._abandoned.add(ticket)
+        self._cond.notify_all()
+
+    def _advance(self) -> None:
+        while self._serving in self._abandoned:
+            self._abandoned.discard(self._serving)
+            self._serving += 1
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.checkout_timeout_s
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+                ticket, self._next_ticket = self._next_ticket, self._next_ticket + 1
+                waited = False
+                while ticket != self._serving or (not self._idle and self._size >= self.max_size):
+                    remaining = deadline - time.monotonic()
+                    if self._closed:
+                        raise psycopg2.InterfaceError("connection pool is closed")
+                    if remaining <= 0:
+                        self._skip_ticket(ticket)
+                        raise PoolTimeout(f"no Lakebase connection free after {self.checkout_timeout_s:g}s "
+                                          f"({self.max_size} in use)")
+                    waited = True
+                    self._cond.wait(remaining)
+                self._serving += 1
+                self._advance()
+                self._cond.notify_all()
+                if waited:
+                    self.stats["waits"] += 1
+                if self._idle:
+                    conn, opened_at, returned_at = self._idle.pop()
+                else:
+                    conn, opened_at, returned_at = None, time.monotonic(), time.monotonic()
+                    self._size += 1
+            if conn is None:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify_all()
+                    raise
+            elif not self._healthy(conn, returned_at):
+                # Dead connection: drop it and try again
+                self._discard(conn)
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify_all()
+                continue
+            with self._cond:
+                self.stats["checkouts"] += 1
+            return conn, opened_at
+
+    def _checkin(self, conn, opened_at: float) -> None:
+        # Connections past max_lifetime_s are closed, so the pool moves on to
+        # connections opened with the current token
+        reuse = not conn.closed and time.monotonic() - opened_at < self.max_lifetime_s
+        if reuse and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                reuse = False
+        with self._cond:
+            reuse = reuse and not self._closed
+            if reuse:
+                self._idle.append((conn, opened_at, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify_all()
+        if not reuse:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """Check out a healthy connection for the duration of the with block"""
+        conn, opened_at = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._checkin(conn, opened_at)
+
+    def status(self) -> Dict:
+        """Pool size and counters, e.g. for display in the app"""
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "in_use": self._size - len(self._idle),
+                    "token_expires_in_s": round(self._token_expires_at - time.time()), **self.stats}
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            conn.close()
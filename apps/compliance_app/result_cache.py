@@ -0,0 +1,78 @@
+"""
+In-process query result cache shared by all sessions of the app.
+
+Entries expire after ttl_s and the least recently used ones are evicted once
+the cached DataFrames exceed max_bytes. Results are shared, so callers must
+treat returned DataFrames as read-only.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+import pandas as pd
+
+
+class ResultCache:
+    """Thread-safe TTL + LRU cache of DataFrames, bounded by memory size"""
+
+    def __init__(self, ttl_s: float = 300.0, max_bytes: int = 256 * 1024 * 1024):
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+        self._entries = OrderedDict()  # key -> (df, size, stored_at), least recently used first
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Return the cached result for key, or compute and cache it; exceptions are not cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[2] < self.ttl_s:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+            if entry is not None:
+                self._drop(key)
+                self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            generation = self._generation
+
+        # Computed outside the lock so other queries are not held up; two
+        # sessions missing the same key at once both run the query.
+        df = compute()
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            # Skip results that were computed before an invalidate(), and
+            # results too large to ever fit
+            if generation != self._generation or size > self.max_bytes:
+                return df
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (df, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+        return df
+
+    def _drop(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate(self) -> None:
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation += 1
+            self.stats["invalidations"] += 1
+
+    def status(self) -> Dict:
+        """Entry count, memory use and hit rate, e.g. for display in the app"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {"entries": len(self._entries), "mb": self._bytes / 1024 / 1024,
+                    "hit_rate": self.stats["hits"] / lookups if lookups else 0.0, **self.stats}
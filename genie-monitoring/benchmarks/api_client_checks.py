@@ -0,0 +1,149 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Genie API client checks
+# MAGIC
+# MAGIC Runs `genie_api_client` against the local Genie API stand-in (`genie_api_standin`) and fails with an `AssertionError` if the client misbehaves:
+# MAGIC - **Throttling**: with `429` responses injected, every one of them reaches the adaptive rate limiter (`throttled > 0`, matching the stand-in's count) and the limiter lowers its rate.
+# MAGIC - **Date-form Retry-After**: a `Retry-After` sent as an HTTP date pauses the limiter like one in seconds, instead of failing the fetch.
+# MAGIC - **Executor fetch**: `fetch_messages_partition` run through `mapPartitions` returns every message of the healthy conversations, one error row per conversation that keeps failing, and accumulator totals that match the requests the stand-in saw.
+# MAGIC - **Expired token**: when the stand-in stops accepting the token, the driver re-authenticates once and reports `AuthExpired`, with the `requests` session and, if `aiohttp` is installed, with the async engine. An executor task returns the rest of its partition as `AuthExpired` rows without fetching it, so `genie_metrics` can fetch it again with a new token.
+# MAGIC
+# MAGIC Run it on a single-node cluster, so Spark runs in local mode and executor tasks can reach the stand-in on `127.0.0.1`.
+
+# COMMAND ----------
+
+# MAGIC %run ./genie_api_standin
+
+# COMMAND ----------
+
+# DBTITLE 1,Client settings
+from databricks.sdk import WorkspaceClient
+
+MAX_RPS = 20.0
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+BACKOFF_BASE_S = 0.05  # short backoffs keep the checks fast
+BACKOFF_CAP_S = 1.0
+PAGE_SIZE = 100
+HTTP_ENGINE = "sdk"
+MAX_IN_FLIGHT = MAX_WORKERS * 2
+try:
+    import aiohttp  # only for the async engine case under Expired token
+except ImportError:
+    aiohttp = None
+
+standin = GenieStandIn(spaces=4, conversations_per_space=10, messages_per_conversation=150,
+                       latency_ms=5, throttle_rate=0.2, retry_after_s=1)
+w = WorkspaceClient(host=standin.start(), token="standin")
+standin.reset_stats()  # newer SDKs look up host metadata when the client is created
+
+# COMMAND ----------
+
+# MAGIC %run ../genie_api_client
+
+# COMMAND ----------
+
+# DBTITLE 1,429s reach the adaptive rate limiter
+start_rate = rate_limiter.rate
+space_work = [(s["space_id"],) for s in list_spaces()]
+conversations = [(sid, c["conversation_id"]) for (sid,), convs in fan_out(list_conversations, space_work) for c in convs]
+results = list(fan_out(fetch_message_pages, conversations))
+print(f"client: {api_stats} | stand-in: {standin.stats} | rate {start_rate:.2f} -> {rate_limiter.rate:.2f} req/s")
+
+assert api_stats["throttled"] > 0, "no 429 reached the rate limiter"
+assert api_stats["throttled"] == standin.stats["throttled"], "some 429s were retried outside the rate limiter"
+assert api_stats["requests"] == standin.stats["requests"]
+assert rate_limiter.rate < start_rate, "the rate limiter did not back off"
+for (sid, cid), (pages, error) in results:
+    if error is None:
+        assert sum(len(msgs) for msgs, _ in pages) == standin.message_count(cid), cid
+
+# COMMAND ----------
+
+# DBTITLE 1,Date-form Retry-After
+from email.utils import formatdate
+
+assert 25 < _retry_after_s(formatdate(time.time() + 30, usegmt=True)) <= 30
+assert _retry_after_s(formatdate(time.time() - 30, usegmt=True)) is None
+assert _retry_after_s("2") == 2.0 and _retry_after_s("soon") is None and _retry_after_s(None) is None
+
+standin.retry_after_date, standin.retry_after_s = True, 2
+standin.reset_stats()
+throttled_before = api_stats["throttled"]
+results = list(fan_out(fetch_message_pages, conversations[:10]))
+print(f"client: {api_stats} | stand-in: {standin.stats}")
+assert standin.stats["throttled"] > 0 and api_stats["throttled"] - throttled_before == standin.stats["throttled"]
+for (sid, cid), (pages, error) in results:
+    assert error is None, (cid, error)
+    assert sum(len(msgs) for msgs, _ in pages) == standin.message_count(cid), cid
+standin.retry_after_date, standin.retry_after_s = False, 1
+
+# COMMAND ----------
+
+# DBTITLE 1,Executor fetch with mapPartitions
+from collections import Counter
+import math
+
+standin.throttle_rate = 0.0
+failing = {cid for _, cid in conversations[::7]}
+standin.failing_conversations = failing
+
+def fetch_on_executors(headers: Dict[str, str]) -> Tuple[List[Tuple], Dict[str, int]]:
+    # Same call as genie_metrics makes with fetch_engine = executors
+    acc = {k: spark.sparkContext.accumulator(0) for k in api_stats}
+    host = w.config.host
+    work = spark.createDataFrame([(sid, cid, None) for sid, cid in conversations],
+                                 "space_id STRING, conversation_id STRING, next_page_token STRING")
+    rows = (work.repartition(4)
+        .rdd.mapPartitions(lambda rows: fetch_messages_partition(rows, host, headers, 10.0, acc))
+        .collect())
+    return rows, {k: a.value for k, a in acc.items()}
+
+standin.reset_stats()
+rows, totals = fetch_on_executors(w.config.authenticate())
+print(f"executors: {totals} | stand-in: {standin.stats} | {len(rows)} rows")
+
+healthy = [cid for _, cid in conversations if cid not in failing]
+fetched = Counter(cid for _, cid, _, error in rows if error is None)
+errors = {cid: error for _, cid, _, error in rows if error is not None}
+assert dict(fetched) == {cid: standin.message_count(cid) for cid in healthy}
+assert set(errors) == failing and all("HTTP 500" in e for e in errors.values())
+assert len(rows) == sum(fetched.values()) + len(failing), "expected one error row per failed conversation"
+pages = sum(math.ceil(standin.message_count(cid) / PAGE_SIZE) for cid in healthy)
+assert totals == {"requests": pages + len(failing) * (MAX_RETRIES + 1), "pages": pages, "throttled": 0,
+                  "retried": len(failing) * MAX_RETRIES, "failed": len(failing)}, totals
+assert totals["requests"] == standin.stats["requests"]
+
+# COMMAND ----------
+
+# DBTITLE 1,Expired token
+standin.token = "rotated"  # the token the client holds is no longer accepted
+standin.reset_stats()
+pages_before, error = fetch_message_pages(*conversations[0])
+assert error.startswith("AuthExpired") and standin.stats["requests"] == 2, (error, standin.stats)
+
+if aiohttp is not None:
+    engine = AsyncHttpEngine(w.config.host, MAX_IN_FLIGHT)
+    sid, cid = conversations[0]
+    standin.reset_stats()
+    try:
+        engine.submit(f"/api/2.0/genie/spaces/{sid}/conversations/{cid}/messages", _page_query(None)).result()
+        raise AssertionError("the async engine accepted a rejected token")
+    except AuthExpired:
+        pass
+    finally:
+        engine.close()
+    assert standin.stats["requests"] == 2, standin.stats
+
+standin.reset_stats()
+rows, totals = fetch_on_executors(w.config.authenticate())
+print(f"executors: {totals} | stand-in: {standin.stats} | {len(rows)} rows")
+assert len(rows) == len(conversations) and all(error.startswith("AuthExpired") for _, _, _, error in rows)
+# Each task stops after its first conversation: one request and one re-authenticated retry
+assert standin.stats["requests"] == totals["requests"] <= 2 * 4 and totals["failed"] <= 4
+standin.token = None
+
+# COMMAND ----------
+
+standin.stop()
@@ -0,0 +1,198 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Genie API stand-in
+# MAGIC
+# MAGIC A local HTTP server that answers the Genie REST calls made by `genie_metrics` with synthetic data:
+# MAGIC - ListSpaces, ListConversations and ListConversationMessages, paginated with `page_size` / `page_token`
+# MAGIC - SCIM user lookups by `id eq "..."` filter
+# MAGIC
+# MAGIC Latency, 429 throttling (with `Retry-After` in seconds or as an HTTP date) and 503 errors are injected at configurable rates. Optionally only one bearer token is accepted (401 otherwise), and chosen conversations always fail with a 500. Data is generated on the fly from ids, so a million messages cost no memory. Shared by the benchmark notebooks through `%run ./genie_api_standin`.
+
+# COMMAND ----------
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from email.utils import formatdate
+import json, random, re, threading, time, zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DAY_MS = 86_400_000
+
+class GenieStandIn:
+    # spaces x conversations_per_space conversations with on average
+    # messages_per_conversation messages each. Every response waits about
+    # latency_ms; a throttle_rate share of requests gets a 429 and an
+    # error_rate share a 503. Retry-After is sent in seconds, or with
+    # retry_after_date as the HTTP date retry_after_s from now. With token set, requests with another bearer
+    # token get a 401 (change it to simulate an expired token). Message
+    # requests for failing_conversations always get a 500.
+    def __init__(self, spaces: int = 200, conversations_per_space: int = 50,
+                 messages_per_conversation: int = 100, users: int = 2000, days: int = 120,
+                 latency_ms: float = 50.0, throttle_rate: float = 0.0, retry_after_s: int = 1,
+                 retry_after_date: bool = False,
+                 error_rate: float = 0.0, max_page_size: int = 100, seed: int = 7,
+                 token: Optional[str] = None, failing_conversations: Iterable[str] = ()):
+        self.spaces = spaces
+        self.conversations_per_space = conversations_per_space
+        self.messages_per_conversation = messages_per_conversation
+        self.users = users
+        self.days = days
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.retry_after_s = retry_after_s
+        self.retry_after_date = retry_after_date
+        self.error_rate = error_rate
+        self.max_page_size = max_page_size
+        self.seed = seed
+        self.token = token
+        self.failing_conversations = set(failing_conversations)
+        self.now_ms = int(time.time() * 1000)
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0, "unauthorized": 0}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    # --- synthetic data -------------------------------------------------
+
+    def _h(self, key: str) -> int:
+        return zlib.crc32(f"{self.seed}:{key}".encode())
+
+    def _space_ids(self) -> List[str]:
+        return [f"standin-space-{i:05d}" for i in range(self.spaces)]
+
+    def _user_id(self, key: str) -> str:
+        return str(10**15 + self._h(key) % self.users)
+
+    def space(self, space_id: str) -> Dict:
+        return {"space_id": space_id, "title": f"Space {space_id[-5:]}",
+                "description": "Synthetic Genie space", "warehouse_id": f"wh{self._h(space_id) % 8}"}
+
+    def conversations(self, space_id: str) -> List[Dict]:
+        out = []
+        for j in range(self.conversations_per_space):
+            cid = f"{space_id}-c{j:05d}"
+            created = self.now_ms - self._h(cid) % (self.days * DAY_MS)
+            out.append({"conversation_id": cid, "title": f"Question {j}", "user_id": self._user_id(cid),
+                        "created_timestamp": created,
+                        "last_updated_timestamp": created + self._h(cid + "u") % DAY_MS})
+        return out
+
+    def message_count(self, conversation_id: str) -> int:
+        # 1 .. 2 * messages_per_conversation - 1, averaging messages_per_conversation
+        return 1 + self._h(conversation_id + "n") % max(1, 2 * self.messages_per_conversation - 1)
+
+    def message(self, space_id: str, conversation_id: str, k: int) -> Dict:
+        mid = f"{conversation_id}-m{k:04d}"
+        created = self.now_ms - self._h(conversation_id) % (self.days * DAY_MS) + k * 30_000
+        attachments = [{"attachment_id": f"{mid}-t", "text": {"id": f"{mid}-t", "content": "Here is the answer."}}]
+        if k % 2 == 0:
+            attachments.append({"attachment_id": f"{mid}-q", "query": {
+                "id": f"{mid}-q", "title": "Result", "description": "Synthetic query",
+                "query": "SELECT region, SUM(amount) FROM sales GROUP BY region",
+                "statement_id": f"stmt-{self._h(mid):08x}", "last_updated_timestamp": created + 2_000,
+                "query_result_metadata": {"row_count": self._h(mid) % 1000, "is_truncated": False},
+            }})
+        return {"message_id": mid, "conversation_id": conversation_id, "space_id": space_id,
+                "user_id": self._user_id(conversation_id), "status": "COMPLETED",
+                "content": f"Synthetic question {k} about sales by region",
+                "created_timestamp": created, "last_updated_timestamp": created + 5_000,
+                "attachments": attachments}
+
+    # --- HTTP -----------------------------------------------------------
+
+    def _page(self, items_key: str, total: int, make, query: Dict) -> Dict:
+        size = min(int(query.get("page_size", [self.max_page_size])[0]), self.max_page_size)
+        start = int(query.get("page_token", ["0"])[0])
+        body = {items_key: [make(i) for i in range(start, min(start + size, total))]}
+        if start + size < total:
+            body["next_page_token"] = str(start + size)
+        return body
+
+    def _users(self, query: Dict) -> Dict:
+        # users.list pages with startIndex; every id is on the first page
+        ids = re.findall(r'id eq "([^"]+)"', query.get("filter", [""])[0])
+        if int(query.get("startIndex", ["1"])[0]) > 1:
+            ids = []
+        resources = [{"id": uid, "displayName": f"User {uid[-4:]}", "userName": f"user{uid[-4:]}@example.com",
+                      "active": True} for uid in ids if uid.isdigit()]
+        return {"Resources": resources, "totalResults": len(resources), "startIndex": 1,
+                "itemsPerPage": len(resources)}
+
+    def route(self, path: str, query: Dict) -> Tuple[int, Dict]:
+        parts = path.strip("/").split("/")
+        if parts[:4] == ["api", "2.0", "genie", "spaces"]:
+            if len(parts) == 4:
+                ids = self._space_ids()
+                return 200, self._page("spaces", len(ids), lambda i: self.space(ids[i]), query)
+            if len(parts) == 6 and parts[5] == "conversations" and parts[4] in set(self._space_ids()):
+                convs = self.conversations(parts[4])
+                return 200, self._page("conversations", len(convs), lambda i: convs[i], query)
+            if len(parts) == 8 and parts[5] == "conversations" and parts[7] == "messages":
+                sid, cid = parts[4], parts[6]
+                if cid in self.failing_conversations:
+                    return 500, {"error_code": "INTERNAL_ERROR", "message": "Injected failure"}
+                return 200, self._page("messages", self.message_count(cid),
+                                       lambda k: self.message(sid, cid, k), query)
+        if path.rstrip("/").endswith("/scim/v2/Users"):
+            return 200, self._users(query)
+        return 404, {"error_code": "NOT_FOUND", "message": f"No route for {path}"}
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                with standin._lock:
+                    standin.stats["requests"] += 1
+                time.sleep(standin.latency_ms / 1000 * random.uniform(0.5, 1.5))
+                headers = {}
+                roll = random.random()
+                if standin.token and self.headers.get("Authorization") != f"Bearer {standin.token}":
+                    with standin._lock:
+                        standin.stats["unauthorized"] += 1
+                    status, body = 401, {"error_code": "UNAUTHENTICATED", "message": "Invalid access token"}
+                elif roll < standin.throttle_rate:
+                    with standin._lock:
+                        standin.stats["throttled"] += 1
+                    status, body = 429, {"error_code": "TOO_MANY_REQUESTS", "message": "Rate limit exceeded"}
+                    headers["Retry-After"] = (formatdate(time.time() + standin.retry_after_s, usegmt=True)
+                                              if standin.retry_after_date else str(standin.retry_after_s))
+                elif roll < standin.throttle_rate + standin.error_rate:
+                    with standin._lock:
+                        standin.stats["errors"] += 1
+                    status, body = 503, {"error_code": "TEMPORARILY_UNAVAILABLE", "message": "Injected error"}
+                else:
+                    url = urlparse(self.path)
+                    status, body = standin.route(url.path, parse_qs(url.query))
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        # port 0 picks a free port; returns the base URL
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="genie-standin", daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {k: 0 for k in self.stats}
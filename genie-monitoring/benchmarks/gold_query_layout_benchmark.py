@@ -0,0 +1,110 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Gold query layout benchmark
+# MAGIC
+# MAGIC Measures the 90-day gold queries against two copies of `genie_messages` and `genie_conversations`:
+# MAGIC - **before** - the original `PARTITIONED BY (space_id)` layout
+# MAGIC - **after** - liquid clustering on `(created_timestamp, space_id)`, compacted with `OPTIMIZE`
+# MAGIC
+# MAGIC The queries run on a SQL warehouse. Duration, bytes read and pruned files come from query history, and each result is appended to `layout_benchmarks` so runs can be compared over time.
+
+# COMMAND ----------
+
+dbutils.widgets.text("catalog", "renjiharold_demo", "Catalog")
+dbutils.widgets.text("schema", "genie_analytics", "Schema")
+dbutils.widgets.text("warehouse_id", "", "SQL warehouse ID")
+dbutils.widgets.text("runs", "3", "Runs per query")
+
+# COMMAND ----------
+
+# MAGIC %run ./warehouse_query_metrics
+
+# COMMAND ----------
+
+from pyspark.sql import functions as F
+
+CATALOG = dbutils.widgets.get("catalog").strip()
+SCHEMA  = dbutils.widgets.get("schema").strip()
+WAREHOUSE_ID = dbutils.widgets.get("warehouse_id").strip()
+RUNS = int(dbutils.widgets.get("runs"))
+PREFIX = f"{CATALOG}.{SCHEMA}"
+
+LAYOUTS = {
+    "before": "PARTITIONED BY (space_id)",
+    "after": "CLUSTER BY (created_timestamp, space_id)",
+}
+
+# COMMAND ----------
+
+# DBTITLE 1,Copies of the silver tables in each layout
+for label, layout in LAYOUTS.items():
+    for table in ("genie_messages", "genie_conversations"):
+        copy = f"{PREFIX}.bench_{label}_{table}"
+        spark.sql(f"CREATE OR REPLACE TABLE {copy} {layout} AS SELECT * FROM {PREFIX}.{table}")
+        spark.sql(f"OPTIMIZE {copy}")
+
+# COMMAND ----------
+
+# DBTITLE 1,90-day gold queries
+# Full-history scans as the gold tables were built before the daily facts,
+# and still the shape of the fact refresh queries over a 90-day window.
+GOLD_QUERIES = {
+    "conv_last_90d": """
+        SELECT c.space_id, DATE_TRUNC('day', c.created_timestamp) AS day, COUNT(c.conversation_id)
+        FROM {conversations} c
+        WHERE c.created_timestamp >= DATEADD(day, -90, CURRENT_TIMESTAMP())
+        GROUP BY 1, 2""",
+    "daily_unique_creators_last_90d": """
+        SELECT m.space_id, DATE_TRUNC('day', m.created_timestamp) AS day, COUNT(DISTINCT author_id)
+        FROM {messages} m
+        WHERE m.created_timestamp >= DATEADD(day, -90, CURRENT_TIMESTAMP())
+        GROUP BY 1, 2""",
+    "top_creators_90d": """
+        SELECT m.space_id, m.author_name, COUNT(DISTINCT conversation_id)
+        FROM {messages} m
+        WHERE m.created_timestamp >= DATEADD(day, -90, CURRENT_TIMESTAMP())
+        GROUP BY 1, 2""",
+    "messages_per_conversation_90d": """
+        SELECT c.conversation_id, m.author_name, COUNT(m.message_id),
+               MIN(m.created_timestamp), MAX(m.created_timestamp)
+        FROM {conversations} c
+        LEFT JOIN {messages} m ON m.conversation_id = c.conversation_id
+          AND m.created_timestamp >= DATEADD(day, -90, CURRENT_TIMESTAMP())
+        WHERE c.created_timestamp >= DATEADD(day, -90, CURRENT_TIMESTAMP())
+        GROUP BY 1, 2""",
+    "conversation_hour_hist_90d": """
+        SELECT c.space_id, HOUR(c.created_timestamp), COUNT(*)
+        FROM {conversations} c
+        WHERE c.created_timestamp >= DATEADD(day, -90, CURRENT_TIMESTAMP())
+        GROUP BY 1, 2""",
+}
+
+# COMMAND ----------
+
+# DBTITLE 1,Run
+results = []
+for label in LAYOUTS:
+    tables = {"messages": f"{PREFIX}.bench_{label}_genie_messages",
+              "conversations": f"{PREFIX}.bench_{label}_genie_conversations"}
+    for name, sql in GOLD_QUERIES.items():
+        for run in range(RUNS):
+            m = run_and_measure(sql.format(**tables), WAREHOUSE_ID)
+            results.append((label, name, run, m["duration_ms"], m["read_bytes"], m["read_files"], m["pruned_files"]))
+
+results_df = (spark.createDataFrame(results,
+        "layout STRING, query STRING, run INT, duration_ms BIGINT, read_bytes BIGINT, read_files BIGINT, pruned_files BIGINT")
+    .withColumn("benchmarked_at", F.current_timestamp()))
+results_df.write.mode("append").saveAsTable(f"{PREFIX}.layout_benchmarks")
+
+display(results_df
+    .groupBy("query")
+    .pivot("layout", list(LAYOUTS))
+    .agg(F.min("duration_ms").alias("best_ms"), F.min("read_bytes").alias("read_bytes"), F.max("pruned_files").alias("pruned_files"))
+    .orderBy("query"))
+
+# COMMAND ----------
+
+for label in LAYOUTS:
+    for table in ("genie_messages", "genie_conversations"):
+        spark.sql(f"DROP TABLE IF EXISTS {PREFIX}.bench_{label}_{table}")
@@ -0,0 +1,75 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Unique-user sketch accuracy check
+# MAGIC
+# MAGIC `genie_metrics.py` stores one HyperLogLog sketch of message authors per space and day in `f_daily_space_user_sketches`. Unique users over any date range are computed by merging those sketches instead of rescanning `genie_messages`.
+# MAGIC
+# MAGIC With `lgConfigK = 12` (4096 registers) the relative standard error is `1.04 / sqrt(4096)`, about **1.6%**. Roughly 99.7% of estimates fall within 3 standard errors, about **4.9%**. Small cardinalities (up to a few hundred users) are usually exact.
+# MAGIC
+# MAGIC This notebook compares merged-sketch estimates with exact `COUNT(DISTINCT)` over `genie_messages` for several windows, per space and across all spaces. Even a correct sketch lands outside 3 sigma about 0.3% of the time, so the check allows up to 1% of estimates (at least one) outside that bound. It fails if more are, or if any estimate is outside 5 sigma, about 8.1%.
+
+# COMMAND ----------
+
+dbutils.widgets.text("catalog", "renjiharold_demo", "Catalog")
+dbutils.widgets.text("schema", "genie_analytics", "Schema")
+
+# COMMAND ----------
+
+from functools import reduce
+from pyspark.sql import functions as F
+
+CATALOG = dbutils.widgets.get("catalog").strip()
+SCHEMA  = dbutils.widgets.get("schema").strip()
+spark.sql(f"USE CATALOG {CATALOG}")
+spark.sql(f"USE {SCHEMA}")
+
+HLL_LG_CONFIG_K = 12
+STD_ERROR = 1.04 / (2 ** HLL_LG_CONFIG_K) ** 0.5
+BOUND = 3 * STD_ERROR
+HARD_BOUND = 5 * STD_ERROR
+MAX_OUT_OF_BOUND_SHARE = 0.01
+WINDOWS_DAYS = [1, 7, 30, 90, 365]
+
+# COMMAND ----------
+
+# DBTITLE 1,Estimated vs exact unique users
+checks = []
+for days in WINDOWS_DAYS:
+    window = f"DATE_SUB(CURRENT_DATE(), {days - 1})"
+    checks.append(spark.sql(f"""
+        WITH est AS (
+          SELECT COALESCE(space_id, '*') AS space_id,
+                 hll_sketch_estimate(hll_union_agg(author_sketch)) AS estimated
+          FROM f_daily_space_user_sketches
+          WHERE day >= {window}
+          GROUP BY ROLLUP(space_id)
+        ),
+        exact AS (
+          SELECT COALESCE(space_id, '*') AS space_id, COUNT(DISTINCT author_id) AS exact
+          FROM genie_messages
+          WHERE DATE(created_timestamp) >= {window} AND author_id IS NOT NULL
+          GROUP BY ROLLUP(space_id)
+        )
+        SELECT {days} AS window_days, space_id, exact, estimated
+        FROM exact JOIN est USING (space_id)
+    """))
+
+results = reduce(lambda a, b: a.unionByName(b), checks).withColumn(
+    "rel_error", F.when(F.col("exact") > 0, F.abs(F.col("estimated") - F.col("exact")) / F.col("exact")).otherwise(0.0)
+).withColumn("within_bound", F.col("rel_error") <= BOUND)
+display(results.orderBy("window_days", F.desc("exact")))
+
+# COMMAND ----------
+
+summary = results.agg(
+    F.count("*").alias("checks"),
+    F.max("rel_error").alias("max_rel_error"),
+    F.sum((~F.col("within_bound")).cast("int")).alias("out_of_bound"),
+).first()
+print(f"{summary['checks']} checks, max relative error {summary['max_rel_error']:.4f} "
+      f"(bound {BOUND:.4f}), {summary['out_of_bound']} out of bound")
+allowed = max(1, int(MAX_OUT_OF_BOUND_SHARE * summary["checks"]))
+assert summary["out_of_bound"] <= allowed, \
+    f"{summary['out_of_bound']} HLL estimates exceeded the 3-sigma error bound, at most {allowed} may"
+assert summary["max_rel_error"] <= HARD_BOUND, "an HLL estimate exceeded the 5-sigma error bound"
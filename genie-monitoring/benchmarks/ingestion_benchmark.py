@@ -0,0 +1,107 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Ingestion throughput benchmark
+# MAGIC
+# MAGIC Runs `genie_metrics` end to end against the local Genie API stand-in (`genie_api_standin`), once per crawler configuration, with no live Genie workspace involved. Run it on a single-node cluster: Spark then runs in local mode on the driver, and executor tasks reach the stand-in on `127.0.0.1`.
+# MAGIC
+# MAGIC Every run starts from an empty scratch schema with `ingest_mode = full`. Per stage it reports wall time, API requests/sec, rows/sec and the driver memory high-water mark, plus end-to-end time. Results are appended to `ingestion_benchmarks` so each optimization can be compared with earlier runs.
+
+# COMMAND ----------
+
+dbutils.widgets.text("catalog", "renjiharold_demo", "Catalog")
+dbutils.widgets.text("schema", "genie_analytics", "Schema for benchmark results")
+dbutils.widgets.text("scratch_schema", "genie_bench_scratch", "Scratch schema (dropped before every run)")
+dbutils.widgets.text("spaces", "200", "Spaces")
+dbutils.widgets.text("conversations_per_space", "50", "Conversations per space")
+dbutils.widgets.text("messages_per_conversation", "100", "Messages per conversation (average)")
+dbutils.widgets.text("latency_ms", "50", "Stand-in latency (ms)")
+dbutils.widgets.text("throttle_rate", "0.02", "Share of requests answered with 429")
+dbutils.widgets.text("error_rate", "0.005", "Share of requests answered with 503")
+# fetch_engine/http_engine pairs, one benchmark run each
+dbutils.widgets.text("configs", "driver/sdk,driver/async,executors/sdk", "Configurations")
+dbutils.widgets.text("max_workers", "8", "Max concurrent API workers")
+dbutils.widgets.text("max_rps", "50", "Max API requests per second")
+
+# COMMAND ----------
+
+# MAGIC %run ./genie_api_standin
+
+# COMMAND ----------
+
+from pyspark.sql import functions as F
+import json, time, uuid
+
+CATALOG = dbutils.widgets.get("catalog").strip()
+SCHEMA = dbutils.widgets.get("schema").strip()
+SCRATCH = dbutils.widgets.get("scratch_schema").strip()
+CONFIGS = [c.strip().split("/") for c in dbutils.widgets.get("configs").split(",") if c.strip()]
+RESULTS_TABLE = f"{CATALOG}.{SCHEMA}.ingestion_benchmarks"
+BENCH_ID = uuid.uuid4().hex
+
+standin = GenieStandIn(
+    spaces=int(dbutils.widgets.get("spaces")),
+    conversations_per_space=int(dbutils.widgets.get("conversations_per_space")),
+    messages_per_conversation=int(dbutils.widgets.get("messages_per_conversation")),
+    latency_ms=float(dbutils.widgets.get("latency_ms")),
+    throttle_rate=float(dbutils.widgets.get("throttle_rate")),
+    error_rate=float(dbutils.widgets.get("error_rate")),
+)
+api_host = standin.start()
+print(f"Genie API stand-in on {api_host}: {standin.spaces} spaces, "
+      f"~{standin.spaces * standin.conversations_per_space * standin.messages_per_conversation:,} messages")
+
+# COMMAND ----------
+
+# DBTITLE 1,Run the ingestion once per configuration
+results = []
+for fetch_engine, http_engine in CONFIGS:
+    spark.sql(f"DROP SCHEMA IF EXISTS {CATALOG}.{SCRATCH} CASCADE")
+    standin.reset_stats()
+    started = time.monotonic()
+    out = json.loads(dbutils.notebook.run("../genie_metrics", 0, {
+        "catalog": CATALOG,
+        "schema": SCRATCH,
+        "ingest_mode": "full",
+        "resume_run": "false",
+        "api_host": api_host,
+        "fetch_engine": fetch_engine,
+        "http_engine": http_engine,
+        "max_workers": dbutils.widgets.get("max_workers"),
+        "max_rps": dbutils.widgets.get("max_rps"),
+    }))
+    end_to_end_s = time.monotonic() - started
+    print(f"{fetch_engine}/{http_engine}: {end_to_end_s:.1f}s end to end, stand-in saw {standin.stats}")
+    for st in out["stages"]:
+        results.append({
+            "bench_id": BENCH_ID, "config": f"{fetch_engine}/{http_engine}", "run_id": out["run_id"],
+            "end_to_end_s": round(end_to_end_s, 3), "standin_requests": standin.stats["requests"],
+            "standin_throttled": standin.stats["throttled"], "standin_errors": standin.stats["errors"],
+            **st,
+        })
+
+standin.stop()
+
+# COMMAND ----------
+
+# DBTITLE 1,Stage metrics
+results_df = (spark.createDataFrame(results)
+    .withColumn("spaces", F.lit(standin.spaces))
+    .withColumn("conversations_per_space", F.lit(standin.conversations_per_space))
+    .withColumn("messages_per_conversation", F.lit(standin.messages_per_conversation))
+    .withColumn("latency_ms", F.lit(standin.latency_ms))
+    .withColumn("throttle_rate", F.lit(standin.throttle_rate))
+    .withColumn("measured_at", F.current_timestamp()))
+results_df.write.mode("append").option("mergeSchema", "true").saveAsTable(RESULTS_TABLE)
+
+display(results_df.select("config", "stage", "seconds", "requests", "requests_per_s", "rows", "rows_per_s",
+                          "throttled", "retried", "failed", "peak_rss_mb", "end_to_end_s"))
+
+# COMMAND ----------
+
+# DBTITLE 1,End-to-end time per configuration across benchmark runs
+display(spark.table(RESULTS_TABLE)
+    .groupBy("bench_id", "config", "spaces", "conversations_per_space", "messages_per_conversation")
+    .agg(F.max("measured_at").alias("measured_at"), F.max("end_to_end_s").alias("end_to_end_s"),
+         F.max("peak_rss_mb").alias("peak_rss_mb"))
+    .orderBy(F.desc("measured_at"), "config"))
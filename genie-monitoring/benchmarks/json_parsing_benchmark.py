@@ -0,0 +1,102 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Message payload parsing benchmark
+# MAGIC
+# MAGIC Compares the two ways `genie_metrics.py` has flattened message payloads on a synthetic dataset:
+# MAGIC - **get_json_object** - one call per extracted field, so every field re-parses the JSON string
+# MAGIC - **from_json** - one typed parse per row, as the notebook does now
+# MAGIC
+# MAGIC The from_json variant runs the notebook's own schema and column expressions from `genie_payloads`, so it times exactly what `genie_metrics` runs. The get_json_object variant extracts the same fields. Both are written to the `noop` sink so only parsing and projection are timed.
+
+# COMMAND ----------
+
+dbutils.widgets.text("num_messages", "10000000", "Synthetic messages")
+
+# COMMAND ----------
+
+# MAGIC %run ../genie_payloads
+
+# COMMAND ----------
+
+# DBTITLE 1,Synthetic message payloads
+from pyspark.sql import functions as F
+import time
+
+NUM_MESSAGES = int(dbutils.widgets.get("num_messages"))
+
+# Shaped like ListConversationMessages items, with one text and one query attachment
+# Array elements share one struct type, so each attachment leaves the other
+# kind null; to_json drops null fields.
+TEXT_ATTACHMENT_TYPE = "STRUCT<id: STRING, content: STRING>"
+QUERY_ATTACHMENT_TYPE = ("STRUCT<id: STRING, title: STRING, query: STRING, statement_id: STRING, "
+                         "query_result_metadata: STRUCT<row_count: BIGINT, is_truncated: BOOLEAN>>")
+text_attachment = F.struct(F.lit("t1").alias("id"), F.lit("Here is the breakdown by region.").alias("content"))
+query_attachment = F.struct(
+    F.lit("q1").alias("id"),
+    F.lit("Orders by region").alias("title"),
+    F.lit("SELECT region, COUNT(*) FROM orders GROUP BY region").alias("query"),
+    F.lit("01ef-stmt").alias("statement_id"),
+    F.struct((F.col("id") % 100).alias("row_count"), F.lit(False).alias("is_truncated")).alias("query_result_metadata"))
+payloads = (spark.range(NUM_MESSAGES)
+    .select(F.to_json(F.struct(
+        F.sha1(F.col("id").cast("string")).alias("message_id"),
+        (F.col("id") % 5000).cast("string").alias("user_id"),
+        F.lit("COMPLETED").alias("status"),
+        F.concat(F.lit("How many orders shipped in region "), (F.col("id") % 50).cast("string"), F.lit("?")).alias("content"),
+        (F.lit(1735689600000) + F.col("id") * 1000).alias("created_timestamp"),
+        (F.lit(1735689600000) + F.col("id") * 1000 + 5000).alias("last_updated_timestamp"),
+        F.array(
+            F.struct(F.lit("a1").alias("attachment_id"), text_attachment.alias("text"),
+                     F.lit(None).cast(QUERY_ATTACHMENT_TYPE).alias("query")),
+            F.struct(F.lit("a2").alias("attachment_id"), F.lit(None).cast(TEXT_ATTACHMENT_TYPE).alias("text"),
+                     query_attachment.alias("query")),
+        ).alias("attachments"),
+        F.struct(F.lit("01ef-stmt").alias("statement_id"), (F.col("id") % 100).alias("row_count")).alias("query_result"),
+    )).alias("payload_json"))
+    .cache())
+payloads.count()
+
+# COMMAND ----------
+
+# DBTITLE 1,Parse strategies
+def with_get_json_object(df):
+    j = lambda path: F.get_json_object("payload_json", path)
+    return df.select(
+        j("$.message_id").alias("message_id"),
+        j("$.user_id").alias("author_id"),
+        F.from_unixtime(j("$.created_timestamp") / 1000).alias("created_timestamp"),
+        F.from_unixtime(j("$.last_updated_timestamp") / 1000).alias("last_updated_timestamp"),
+        j("$.content").alias("content"),
+        j("$.status").alias("status"),
+        j("$.attachments").alias("attachments"),
+        F.coalesce(j("$.attachments[*].query.statement_id"), j("$.query_result.statement_id")).alias("query_statement_id"),
+        F.coalesce(j("$.attachments[*].query.query_result_metadata.row_count"),
+                   j("$.query_result.row_count")).alias("query_row_count"),
+        j("$.error.type").alias("error_type"),
+    )
+
+def with_from_json(df):
+    return parse_message_payloads(df).select(*message_columns())
+
+# COMMAND ----------
+
+# DBTITLE 1,Run
+RUNS = 3
+results = []
+for name, fn in [("get_json_object", with_get_json_object), ("from_json", with_from_json)]:
+    fn(payloads).write.format("noop").mode("overwrite").save()  # warm-up
+    for run in range(RUNS):
+        t0 = time.monotonic()
+        fn(payloads).write.format("noop").mode("overwrite").save()
+        results.append((name, run, time.monotonic() - t0))
+
+results_df = spark.createDataFrame(results, "strategy STRING, run INT, seconds DOUBLE")
+display(results_df
+    .groupBy("strategy")
+    .agg(F.min("seconds").alias("best_s"), F.avg("seconds").alias("avg_s"))
+    .withColumn("messages_per_s", F.lit(NUM_MESSAGES) / F.col("best_s")))
+
+# COMMAND ----------
+
+payloads.unpersist()
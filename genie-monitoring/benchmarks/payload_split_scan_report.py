@@ -0,0 +1,88 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Payload split scan-bytes report
+# MAGIC
+# MAGIC `genie_messages` no longer carries `payload_json`; raw payloads live in `genie_messages_raw`. This report runs the dashboard and gold queries that read `genie_messages` against:
+# MAGIC - **wide** - a copy of `genie_messages` joined back to its payloads, like the table before the split
+# MAGIC - **narrow** - the current `genie_messages`
+# MAGIC
+# MAGIC Bytes and files read come from SQL warehouse query history.
+
+# COMMAND ----------
+
+dbutils.widgets.text("catalog", "renjiharold_demo", "Catalog")
+dbutils.widgets.text("schema", "genie_analytics", "Schema")
+dbutils.widgets.text("warehouse_id", "", "SQL warehouse ID")
+
+# COMMAND ----------
+
+# MAGIC %run ./warehouse_query_metrics
+
+# COMMAND ----------
+
+from pyspark.sql import functions as F
+
+CATALOG = dbutils.widgets.get("catalog").strip()
+SCHEMA  = dbutils.widgets.get("schema").strip()
+WAREHOUSE_ID = dbutils.widgets.get("warehouse_id").strip()
+PREFIX = f"{CATALOG}.{SCHEMA}"
+
+TABLES = {
+    "wide": f"{PREFIX}.bench_wide_genie_messages",
+    "narrow": f"{PREFIX}.genie_messages",
+}
+
+spark.sql(f"""
+CREATE OR REPLACE TABLE {TABLES['wide']} CLUSTER BY (created_timestamp, space_id) AS
+SELECT m.*, r.payload_json
+FROM {PREFIX}.genie_messages m
+LEFT JOIN {PREFIX}.genie_messages_raw r USING (message_id)
+""")
+spark.sql(f"OPTIMIZE {TABLES['wide']}")
+
+# COMMAND ----------
+
+# DBTITLE 1,Queries reading genie_messages
+QUERIES = {
+    "select_star_latest": "SELECT * FROM {messages} ORDER BY created_timestamp DESC LIMIT 1000",
+    "messages_per_conversation": """
+        SELECT c.conversation_id, m.author_name, COUNT(m.message_id)
+        FROM {prefix}.genie_conversations c
+        LEFT JOIN (SELECT * FROM {messages}) m ON m.conversation_id = c.conversation_id
+        WHERE c.created_timestamp >= DATEADD(day, -30, CURRENT_TIMESTAMP())
+        GROUP BY 1, 2""",
+    "new_users_7d": """
+        SELECT COUNT(*) FROM (
+          SELECT author_id, MIN(created_timestamp) AS first_msg_ts FROM {messages} GROUP BY author_id
+        ) WHERE first_msg_ts >= DATEADD(day, -7, CURRENT_TIMESTAMP())""",
+    "power_users_30d": """
+        SELECT COUNT(*) FROM (
+          SELECT author_id, COUNT(*) AS convs_30d FROM {messages}
+          WHERE created_timestamp >= DATEADD(day, -30, CURRENT_TIMESTAMP())
+          GROUP BY author_id
+        ) WHERE convs_30d >= 5""",
+    "most_popular_spaces": """
+        SELECT space_id, COUNT(DISTINCT author_id) FROM {messages} GROUP BY space_id""",
+}
+
+# COMMAND ----------
+
+# DBTITLE 1,Run
+results = []
+for label, table in TABLES.items():
+    for name, sql in QUERIES.items():
+        m = run_and_measure(sql.format(messages=table, prefix=PREFIX), WAREHOUSE_ID)
+        results.append((label, name, m["read_bytes"], m["read_files"], m["duration_ms"]))
+
+results_df = spark.createDataFrame(results, "table STRING, query STRING, read_bytes BIGINT, read_files BIGINT, duration_ms BIGINT")
+display(results_df
+    .groupBy("query")
+    .pivot("table", list(TABLES))
+    .agg(F.first("read_bytes"))
+    .withColumn("bytes_saved_pct", F.round(100 * (1 - F.col("narrow") / F.col("wide")), 1))
+    .orderBy("query"))
+
+# COMMAND ----------
+
+spark.sql(f"DROP TABLE IF EXISTS {TABLES['wide']}")
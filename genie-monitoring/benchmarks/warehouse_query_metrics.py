@@ -0,0 +1,47 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Warehouse query metrics helper
+# MAGIC
+# MAGIC Shared by the benchmark notebooks through `%run ./warehouse_query_metrics`. Statements run on a SQL warehouse, the same engine that serves the dashboard. Duration, bytes read and file pruning are then read back from query history.
+
+# COMMAND ----------
+
+from databricks.sdk import WorkspaceClient
+from databricks.sdk.service.sql import QueryFilter, StatementState
+import time, uuid
+from typing import Dict
+
+w = WorkspaceClient()
+
+def run_and_measure(sql: str, warehouse_id: str, timeout_s: int = 600) -> Dict:
+    # A unique comment keeps the warehouse result cache from answering repeats
+    statement = f"/* benchmark {uuid.uuid4().hex} */\n{sql}"
+    resp = w.statement_execution.execute_statement(
+        statement=statement, warehouse_id=warehouse_id, wait_timeout="0s")
+    deadline = time.monotonic() + timeout_s
+    while resp.status.state in (StatementState.PENDING, StatementState.RUNNING):
+        if time.monotonic() > deadline:
+            w.statement_execution.cancel_execution(resp.statement_id)
+            raise TimeoutError(f"statement {resp.statement_id} still running after {timeout_s}s")
+        time.sleep(1)
+        resp = w.statement_execution.get_statement(resp.statement_id)
+    if resp.status.state != StatementState.SUCCEEDED:
+        raise RuntimeError(f"statement {resp.statement_id} {resp.status.state}: {resp.status.error}")
+
+    # Query history metrics show up a few seconds after the statement finishes
+    for _ in range(30):
+        queries = list(w.query_history.list(
+            filter_by=QueryFilter(statement_ids=[resp.statement_id]), include_metrics=True).res or [])
+        if queries and queries[0].metrics and queries[0].metrics.read_bytes is not None:
+            m = queries[0].metrics
+            return {
+                "statement_id": resp.statement_id,
+                "duration_ms": m.total_time_ms,
+                "read_bytes": m.read_bytes,
+                "read_files": m.read_files_count,
+                "pruned_files": m.pruned_files_count,
+                "rows_read": m.rows_read_count,
+            }
+        time.sleep(2)
+    raise RuntimeError(f"no query history metrics for statement {resp.statement_id}")
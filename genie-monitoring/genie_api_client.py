@@ -0,0 +1,354 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Genie REST API client
+# MAGIC
+# MAGIC Rate-limited, retrying GETs against the Genie REST API, shared by `genie_metrics` and the checks in `benchmarks/`. Run it inline with `%run ./genie_api_client` after defining:
+# MAGIC - `w`: the `WorkspaceClient` whose host and credentials are used
+# MAGIC - `MAX_RPS`, `MAX_WORKERS`, `MAX_RETRIES`, `BACKOFF_BASE_S`, `BACKOFF_CAP_S`, `PAGE_SIZE`
+# MAGIC - `HTTP_ENGINE` (`sdk` or `async`), `MAX_IN_FLIGHT` and `aiohttp` (the module, or `None`)
+# MAGIC
+# MAGIC Requests are sent with a plain `requests` session rather than the SDK `ApiClient`. `ApiClient.do` retries 429s and 503s by itself for up to `retry_timeout_seconds` (5 minutes), so the throttling never reached the adaptive rate limiter below.
+
+# COMMAND ----------
+
+from databricks.sdk.errors import DatabricksError
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+import asyncio, itertools, json, random, requests, threading, time
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# COMMAND ----------
+
+# DBTITLE 1,Rate limiting and retries
+class AdaptiveTokenBucket:
+    # Token bucket shared by every Genie REST call. The refill rate creeps up
+    # towards max_rate while responses are healthy and is halved on every 429
+    # (AIMD). A Retry-After pauses all callers until the server is ready again.
+    def __init__(self, max_rate: float, min_rate: float = 0.5, burst: float = 1.0):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max(self.min_rate, max_rate / 2)
+        self.burst = burst
+        self._step = max_rate / 50
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        # Take a token and return 0, or return how long to wait for one
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if now >= self._paused_until and self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return max(self._paused_until - now, (1 - self._tokens) / self.rate)
+
+    def acquire(self) -> None:
+        while (wait := self._take()) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        while (wait := self._take()) > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self._step)
+
+    def on_throttle(self, retry_after: Optional[float]) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+rate_limiter = AdaptiveTokenBucket(MAX_RPS)
+
+# requests: HTTP calls sent, pages: successful page responses, throttled: 429
+# responses, retried: calls repeated after a 429/5xx, failed: calls that
+# exhausted MAX_RETRIES
+api_stats = {"requests": 0, "pages": 0, "throttled": 0, "retried": 0, "failed": 0}
+_api_stats_lock = threading.Lock()
+
+def _count(stat: str) -> None:
+    with _api_stats_lock:
+        api_stats[stat] += 1
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class AuthExpired(Exception):
+    # HTTP 401 even with newly authenticated headers
+    pass
+
+def _retry_after_s(value: Optional[str]) -> Optional[float]:
+    # Retry-After is either delay-seconds or an HTTP-date. None when it is
+    # missing, already past or unparseable, so the jittered backoff applies.
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            until = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if until.tzinfo is None:
+            until = until.replace(tzinfo=timezone.utc)
+        seconds = (until - datetime.now(timezone.utc)).total_seconds()
+    return seconds if seconds > 0 else None
+
+def _backoff_s(attempt: int) -> float:
+    # Full-jitter exponential backoff
+    return random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+
+def get_with_retries(session: requests.Session, url: str, query: Dict, bucket: AdaptiveTokenBucket,
+                     count: Callable[[str], None], headers: Callable[[], Dict[str, str]]) -> Dict:
+    # One GET under the shared retry policy: a token from bucket per attempt,
+    # Retry-After and a halved rate on 429, full-jitter backoff on 5xx and
+    # connection errors, up to MAX_RETRIES retries. headers() is called for
+    # every attempt, and a 401 is retried once in case the token expired since.
+    # count(stat) tallies the api_stats counters.
+    attempt, reauthenticated = 0, False
+    while True:
+        bucket.acquire()
+        count("requests")
+        retry_after = None
+        try:
+            resp = session.get(url, params=query, headers=headers(), timeout=60)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            err = e
+        else:
+            if resp.ok:
+                bucket.on_success()
+                count("pages")
+                return resp.json()
+            err = DatabricksError(f"GET {url} failed with HTTP {resp.status_code}: {resp.text[:500]}")
+            if resp.status_code == 401 and not reauthenticated:
+                reauthenticated = True
+                count("retried")
+                continue
+            if resp.status_code not in RETRYABLE_STATUS:
+                count("failed")
+                raise AuthExpired(str(err)) if resp.status_code == 401 else err
+            if resp.status_code == 429:
+                count("throttled")
+                retry_after = _retry_after_s(resp.headers.get("Retry-After"))
+                bucket.on_throttle(retry_after)
+        if attempt == MAX_RETRIES:
+            count("failed")
+            raise err
+        count("retried")
+        time.sleep(0 if retry_after else _backoff_s(attempt))
+        attempt += 1
+
+# Driver calls share one session; its connection pool fits every worker thread
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(pool_maxsize=MAX_WORKERS))
+_http.mount("http://", HTTPAdapter(pool_maxsize=MAX_WORKERS))
+
+def _get(path: str, query: Dict) -> Dict:
+    return get_with_retries(_http, w.config.host.rstrip("/") + path, query, rate_limiter, _count, w.config.authenticate)
+
+# COMMAND ----------
+
+# DBTITLE 1,Paginated Genie endpoints
+def _page_query(page_token: Optional[str]) -> Dict:
+    q = {"page_size": PAGE_SIZE}
+    if page_token:
+        q["page_token"] = page_token
+    return q
+
+class AsyncHttpEngine:
+    # GETs run as coroutines on an event loop in a dedicated thread (the
+    # notebook's own loop is already running), over one aiohttp session whose
+    # keep-alive connections are reused across requests. Callers stay
+    # synchronous: submit() returns a concurrent.futures.Future.
+    def __init__(self, host: str, max_in_flight: int):
+        self.host = host.rstrip("/")
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="genie-http", daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._open(max_in_flight), self.loop).result()
+
+    async def _open(self, max_in_flight: int) -> None:
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_in_flight, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=60),
+        )
+
+    async def _get(self, path: str, query: Dict) -> Dict:
+        # Same retry policy as get_with_retries: shared rate limiter,
+        # Retry-After on 429, full-jitter backoff on 5xx and connection errors,
+        # and a 401 retried once with newly authenticated headers.
+        # authenticate() may block on a token refresh, so it runs off the loop.
+        loop = asyncio.get_running_loop()
+        attempt, reauthenticated = 0, False
+        while True:
+            await rate_limiter.acquire_async()
+            _count("requests")
+            retry_after = None
+            headers = await loop.run_in_executor(None, w.config.authenticate)
+            try:
+                async with self._in_flight:
+                    async with self._session.get(self.host + path, params=query, headers=headers) as resp:
+                        if resp.status < 400:
+                            body = await resp.json()
+                            rate_limiter.on_success()
+                            _count("pages")
+                            return body
+                        err = DatabricksError(f"GET {path} failed with HTTP {resp.status}: {(await resp.text())[:500]}")
+                        if resp.status == 401 and not reauthenticated:
+                            reauthenticated = True
+                            _count("retried")
+                            continue
+                        if resp.status not in RETRYABLE_STATUS:
+                            _count("failed")
+                            raise AuthExpired(str(err)) if resp.status == 401 else err
+                        if resp.status == 429:
+                            _count("throttled")
+                            retry_after = _retry_after_s(resp.headers.get("Retry-After"))
+                            rate_limiter.on_throttle(retry_after)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                err = e
+            if attempt == MAX_RETRIES:
+                _count("failed")
+                raise err
+            _count("retried")
+            await asyncio.sleep(0 if retry_after else _backoff_s(attempt))
+            attempt += 1
+
+    def submit(self, path: str, query: Dict):
+        return asyncio.run_coroutine_threadsafe(self._get(path, query), self.loop)
+
+    def pages(self, path: str, page_token: Optional[str] = None) -> Iterator[Tuple[Dict, Optional[str]]]:
+        # The next page is requested as soon as its token is known, so it is
+        # in flight while the caller processes the current one
+        fut = self.submit(path, _page_query(page_token))
+        while True:
+            resp = fut.result()
+            page_token = resp.get("next_page_token")
+            if page_token:
+                fut = self.submit(path, _page_query(page_token))
+            yield resp, page_token
+            if not page_token:
+                break
+
+    def close(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+async_http = AsyncHttpEngine(w.config.host, MAX_IN_FLIGHT) if HTTP_ENGINE == "async" else None
+
+def _pages(path: str, page_token: Optional[str] = None) -> Iterator[Tuple[Dict, Optional[str]]]:
+    # Yield (response, next_page_token) for each page, starting at page_token
+    if async_http is not None:
+        yield from async_http.pages(path, page_token)
+        return
+    while True:
+        resp = _get(path, _page_query(page_token))
+        page_token = resp.get("next_page_token")
+        yield resp, page_token
+        if not page_token:
+            break
+
+def _paged_get(path: str, items_key: str) -> Iterable[Dict]:
+    for resp, _ in _pages(path):
+        yield from resp.get(items_key, [])
+
+def list_spaces() -> List[Dict]:
+    # GET /api/2.0/genie/spaces  (List Genie spaces)
+    # Docs: https://docs.databricks.com/api/workspace/genie/listspaces
+    return list(_paged_get("/api/2.0/genie/spaces", "spaces"))
+
+def list_conversations(space_id: str) -> List[Dict]:
+    # GET /api/2.0/genie/spaces/{space_id}/conversations  (include_all across users)
+    # Docs: https://docs.databricks.com/api/workspace/genie/listconversations
+    return list(_paged_get(f"/api/2.0/genie/spaces/{space_id}/conversations?include_all=true", "conversations"))
+
+def list_conversation_messages(space_id: str, conversation_id: str) -> List[Dict]:
+    # GET /api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages
+    # Docs: https://docs.databricks.com/api/workspace/genie/listconversationmessages
+    return list(_paged_get(f"/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages", "messages"))
+
+class PageLanded(NamedTuple):
+    # Follows a page's records; next_page_token is None once the conversation is complete
+    space_id: str
+    conversation_id: str
+    next_page_token: Optional[str]
+
+class FetchFailed(NamedTuple):
+    space_id: str
+    conversation_id: str
+    error: str
+
+def fetch_message_pages(space_id: str, conversation_id: str, page_token: Optional[str] = None) -> Tuple[List[Tuple[List[Dict], Optional[str]]], Optional[str]]:
+    # Messages of one conversation from page_token on, as ([(messages, next_page_token)], error).
+    # A failure part-way keeps the pages fetched so far, so the crawl can
+    # record where to resume instead of throwing them away.
+    path = f"/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages"
+    pages = []
+    try:
+        for resp, nxt in _pages(path, page_token):
+            pages.append((resp.get("messages", []), nxt))
+    except Exception as e:
+        return pages, f"{type(e).__name__}: {e}"
+    return pages, None
+
+def fan_out(fn: Callable, work: Iterable[Tuple]) -> Iterator[Tuple[Tuple, List[Dict]]]:
+    # Run fn(*args) for every args tuple on a bounded thread pool and yield
+    # (args, result) as each call completes. The shared rate limiter, not the
+    # pool size, decides how fast requests actually go out. Only a small window
+    # of calls is in flight, so results never pile up ahead of the consumer.
+    work = iter(work)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        pending = {pool.submit(fn, *args): args for args in itertools.islice(work, MAX_WORKERS * 2)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                args = pending.pop(fut)
+                for nxt in itertools.islice(work, 1):
+                    pending[pool.submit(fn, *nxt)] = nxt
+                yield args, fut.result()
+
+# COMMAND ----------
+
+# DBTITLE 1,Executor-side message fetch
+def fetch_messages_partition(rows: Iterable, host: str, headers: Dict[str, str], rate: float, stats: Dict) -> Iterator[Tuple]:
+    # Runs on executors, so it talks to the REST API with its own requests
+    # session and token bucket instead of the driver's. stats holds Spark
+    # accumulators named like api_stats. Yields
+    # (space_id, conversation_id, payload_json, error) rows.
+    session = requests.Session()
+    bucket = AdaptiveTokenBucket(rate, min_rate=min(0.5, rate))
+    count = lambda stat: stats[stat].add(1)
+    auth_error = None
+    for r in rows:
+        sid, cid = r["space_id"], r["conversation_id"]
+        if auth_error:
+            # headers were rejected: hand the rest of the partition back to the
+            # driver, which fetches it again with a new token
+            yield (sid, cid, None, auth_error)
+            continue
+        path = f"{host}/api/2.0/genie/spaces/{sid}/conversations/{cid}/messages"
+        # Resume where an earlier attempt of this run stopped. A conversation that
+        # still fails after MAX_RETRIES yields one error row instead of failing the task.
+        page_token = r["next_page_token"]
+        try:
+            while True:
+                body = get_with_retries(session, path, _page_query(page_token), bucket, count, lambda: headers)
+                for m in body.get("messages", []):
+                    yield (sid, cid, json.dumps(m), None)
+                page_token = body.get("next_page_token")
+                if not page_token:
+                    break
+        except AuthExpired as e:
+            auth_error = f"{type(e).__name__}: {e}"
+            yield (sid, cid, None, auth_error)
+        except Exception as e:
+            yield (sid, cid, None, f"{type(e).__name__}: {e}")
@@ -0,0 +1,135 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Genie Audit Events Ingestion
+# MAGIC
+# MAGIC Copies new `aibiGenie` events from [System Tables Audit events](https://docs.databricks.com/aws/en/admin/account-settings/audit-logs#aibi-genie-events) into a local, liquid-clustered `genie_audit_events` table, and refreshes the `genie_audit_daily` rollup for the days that received events.
+# MAGIC
+# MAGIC `system.access.audit` is large and shared by the whole account. Only the events after the local copy's `event_time` watermark are read, so each run scans a few recent `event_date` partitions. The dashboard's feedback, review and space event panels read the rollup instead of the system table.
+# MAGIC
+# MAGIC Schedule it next to `genie_metrics` with the same catalog and schema.
+
+# COMMAND ----------
+
+# DBTITLE 1,User to specify catalog and schema for storing data
+dbutils.widgets.text("catalog", "renjiharold_demo", "Catalog")
+dbutils.widgets.text("schema", "genie_analytics", "Schema")
+
+# COMMAND ----------
+
+# DBTITLE 1,Config
+from pyspark.sql import functions as F
+
+CATALOG = dbutils.widgets.get("catalog").strip()
+SCHEMA  = dbutils.widgets.get("schema").strip()
+
+AUDIT_EVENTS_TABLE = f"{CATALOG}.{SCHEMA}.genie_audit_events"
+AUDIT_DAILY_TABLE  = f"{CATALOG}.{SCHEMA}.genie_audit_daily"
+
+# First run copies this much history
+AUDIT_BACKFILL_DAYS = 90
+# Audit events can be delivered hours after event_time. Each run re-reads this
+# window before the watermark; events already copied are skipped by event_id.
+AUDIT_LATE_ARRIVAL_HOURS = 24
+
+spark.sql(f"CREATE CATALOG IF NOT EXISTS {CATALOG}")
+spark.sql(f"USE CATALOG {CATALOG}")
+spark.sql(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
+spark.sql(f"USE {SCHEMA}")
+
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {AUDIT_EVENTS_TABLE} (
+  event_id STRING,
+  event_time TIMESTAMP,
+  event_date DATE,
+  workspace_id BIGINT,
+  action_name STRING,
+  user_email STRING,
+  space_id STRING,
+  conversation_id STRING,
+  message_id STRING,
+  feedback_rating STRING,
+  status_code INT,
+  request_params MAP<STRING, STRING>
+) USING DELTA
+CLUSTER BY (event_date, action_name)
+""")
+
+# Event counts per day, action, space, user and rating
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {AUDIT_DAILY_TABLE} (
+  event_date DATE,
+  action_name STRING,
+  space_id STRING,
+  user_email STRING,
+  feedback_rating STRING,
+  events BIGINT
+) USING DELTA
+CLUSTER BY (event_date, action_name)
+""")
+
+# COMMAND ----------
+
+# DBTITLE 1,Copy new aibiGenie events
+watermark = spark.table(AUDIT_EVENTS_TABLE).agg(F.max("event_time")).first()[0]
+if watermark is None:
+    since = F.expr(f"current_timestamp() - INTERVAL {AUDIT_BACKFILL_DAYS} DAYS")
+    print(f"No events copied yet: backfilling {AUDIT_BACKFILL_DAYS} days")
+else:
+    since = F.lit(watermark) - F.expr(f"INTERVAL {AUDIT_LATE_ARRIVAL_HOURS} HOURS")
+    print(f"Copying events after {watermark} (re-reading {AUDIT_LATE_ARRIVAL_HOURS}h for late arrivals)")
+
+# event_date is the partition column of system.access.audit: filtering on it
+# limits the scan to the last few days
+new_events = (spark.table("system.access.audit")
+    .where((F.col("service_name") == "aibiGenie")
+           & (F.col("event_date") >= F.to_date(since))
+           & (F.col("event_time") > since))
+    .select(
+        "event_id", "event_time", "event_date", "workspace_id", "action_name",
+        F.col("user_identity.email").alias("user_email"),
+        F.col("request_params.space_id").alias("space_id"),
+        F.col("request_params.conversation_id").alias("conversation_id"),
+        F.col("request_params.message_id").alias("message_id"),
+        F.col("request_params.feedback_rating").alias("feedback_rating"),
+        F.col("response.status_code").alias("status_code"),
+        "request_params",
+    )
+    .dropDuplicates(["event_id"])
+    .cache())
+new_events.createOrReplaceTempView("_audit_incoming")
+
+m = spark.sql(f"""
+MERGE INTO {AUDIT_EVENTS_TABLE} t
+USING _audit_incoming s
+ON t.event_date = s.event_date AND t.event_id = s.event_id
+WHEN NOT MATCHED THEN INSERT *
+""").first()
+print(f"{AUDIT_EVENTS_TABLE}: {int(m['num_inserted_rows'])} new events")
+
+# COMMAND ----------
+
+# DBTITLE 1,Refresh daily rollup
+# Only days that received events change; they are recomputed from the local
+# copy and replaced atomically. An empty rollup is built from all history.
+touched_days = sorted(r["event_date"] for r in new_events.select("event_date").distinct().collect())
+
+rollup = """
+    SELECT event_date, action_name, space_id, user_email, feedback_rating, COUNT(*) AS events
+    FROM genie_audit_events
+    WHERE {days}
+    GROUP BY ALL
+"""
+if spark.table(AUDIT_DAILY_TABLE).isEmpty():
+    spark.sql(f"INSERT OVERWRITE {AUDIT_DAILY_TABLE} {rollup.format(days='true')}")
+elif touched_days:
+    day_list = ", ".join(f"DATE'{d}'" for d in touched_days)
+    spark.sql(f"INSERT INTO {AUDIT_DAILY_TABLE} REPLACE WHERE event_date IN ({day_list}) "
+              f"{rollup.format(days=f'event_date IN ({day_list})')}")
+print(f"{len(touched_days)} day buckets refreshed in {AUDIT_DAILY_TABLE}")
+new_events.unpersist()
+
+display(spark.table(AUDIT_DAILY_TABLE)
+    .where(F.col("event_date") >= F.date_sub(F.current_date(), 7))
+    .groupBy("event_date", "action_name").agg(F.sum("events").alias("events"))
+    .orderBy(F.desc("event_date"), "action_name"))
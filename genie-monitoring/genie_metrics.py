@@ -23,16 +23,59 @@
 dbutils.widgets.text("catalog", "renjiharold_demo", "Catalog")
 dbutils.widgets.text("schema", "genie_analytics", "Schema")
 
+# incremental: fetch messages only for conversations that are new or updated since the last successful run
+# full: re-fetch messages for every stored conversation (backfill)
+dbutils.widgets.dropdown("ingest_mode", "incremental", ["incremental", "full"], "Ingest mode")
+
+# Comma-separated space ids to ingest. Empty: every space returned by ListSpaces.
+dbutils.widgets.text("space_ids", "", "Space ids (empty = all)")
+
+# single: one task lists, fetches, merges and refreshes gold
+# shard:  list and fetch only the spaces with crc32(space_id) % shard_count = shard_index,
+#         land them in bronze and stop (one job task per shard, run in parallel)
+# finalize: merge every landed shard, advance watermarks and refresh gold once
+dbutils.widgets.dropdown("run_mode", "single", ["single", "shard", "finalize"], "Run mode")
+dbutils.widgets.text("shard_count", "1", "Shard count")
+dbutils.widgets.text("shard_index", "0", "Shard index (run_mode = shard)")
+
+# COMMAND ----------
+
+# DBTITLE 1,Crawler tuning
+# Requests are spread over a bounded worker pool that shares one adaptive rate
+# limit. Set max_rps to the Genie API rate limit documented for your workspace.
+dbutils.widgets.text("max_workers", "8", "Max concurrent API workers")
+dbutils.widgets.text("max_rps", "10", "Max API requests per second")
+# driver: message fetching runs on a thread pool on the driver
+# executors: the conversation work list is split across the cluster and each
+# Spark task fetches its share with an equal slice of max_rps
+dbutils.widgets.dropdown("fetch_engine", "driver", ["driver", "executors"], "Message fetch engine")
+# sdk: blocking calls on a requests session, authenticated through the SDK
+# async: an asyncio client with pooled keep-alive connections that prefetches
+# the next page as soon as its token is known (requires aiohttp)
+dbutils.widgets.dropdown("http_engine", "sdk", ["sdk", "async"], "Driver HTTP engine")
+# Base URL of a Genie API stand-in (see benchmarks/genie_api_standin.py).
+# Empty: the workspace this notebook runs in.
+dbutils.widgets.text("api_host", "", "Genie API host override")
+# true: a run that died before advancing its watermarks is picked up where it
+# stopped, skipping conversations it already landed
+dbutils.widgets.dropdown("resume_run", "true", ["true", "false"], "Resume unfinished run")
+
 # COMMAND ----------
 
 # DBTITLE 1,Imports and Config
 # %pip install databricks-sdk==0.33.0
+# %pip install aiohttp  # only for http_engine = async, if the runtime lacks it
 
 from databricks.sdk import WorkspaceClient
-from databricks.sdk.core import ApiClient
 from pyspark.sql import functions as F, types as T
-import json, time
-from typing import Dict, Iterable, List
+import itertools, json, resource, time, uuid, zlib
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 CATALOG = dbutils.widgets.get("catalog").strip()
 SCHEMA  = dbutils.widgets.get("schema").strip()
@@ -40,65 +83,402 @@ SCHEMA  = dbutils.widgets.get("schema").strip()
 SPACES_TABLE = f"{CATALOG}.{SCHEMA}.genie_spaces"
 CONV_TABLE   = f"{CATALOG}.{SCHEMA}.genie_conversations"
 MSG_TABLE    = f"{CATALOG}.{SCHEMA}.genie_messages"
+MSG_RAW_TABLE = f"{CATALOG}.{SCHEMA}.genie_messages_raw"
+CHECKPOINT_TABLE = f"{CATALOG}.{SCHEMA}.genie_ingest_checkpoints"
+CONV_BRONZE_TABLE = f"{CATALOG}.{SCHEMA}.genie_conversations_bronze"
+MSG_BRONZE_TABLE  = f"{CATALOG}.{SCHEMA}.genie_messages_bronze"
+USERS_TABLE  = f"{CATALOG}.{SCHEMA}.genie_users"
+CRAWL_RUNS_TABLE = f"{CATALOG}.{SCHEMA}.genie_crawl_runs"
+CRAWL_PROGRESS_TABLE = f"{CATALOG}.{SCHEMA}.genie_crawl_progress"
+DEAD_LETTER_TABLE = f"{CATALOG}.{SCHEMA}.genie_crawl_dead_letters"
+INGESTION_RUNS_TABLE = f"{CATALOG}.{SCHEMA}.ingestion_runs"
+CONVERSATION_FACTS_TABLE = f"{CATALOG}.{SCHEMA}.conversation_facts"
+
+INGEST_MODE = dbutils.widgets.get("ingest_mode")
+# Conversation summaries without last_updated_timestamp give no signal of new
+# messages, so conversations created within this window are always re-fetched.
+REFETCH_WINDOW_DAYS = 7
 
 PAGE_SIZE = 100
-THROTTLE_S = 0.15  # polite pacing to avoid 429s
-
-w = WorkspaceClient()
-api: ApiClient = w.api_client
+MAX_WORKERS = int(dbutils.widgets.get("max_workers"))
+MAX_RPS = float(dbutils.widgets.get("max_rps"))  # ceiling shared across all workers
+MAX_RETRIES = 5        # per request, for 429s and transient 5xx/connection errors
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 30.0
+FETCH_ENGINE = dbutils.widgets.get("fetch_engine")
+HTTP_ENGINE = dbutils.widgets.get("http_engine")
+if HTTP_ENGINE == "async" and aiohttp is None:
+    print("aiohttp is not installed, falling back to http_engine = sdk")
+    HTTP_ENGINE = "sdk"
+MAX_IN_FLIGHT = MAX_WORKERS * 2  # async engine: open requests, incl. page prefetches
+RESUME_RUN = dbutils.widgets.get("resume_run") == "true"
+API_HOST = dbutils.widgets.get("api_host").strip()
+# Conversations whose message fetch failed this many runs in a row are parked
+# in the dead-letter table and skipped until they are cleared from it.
+DEAD_LETTER_MAX_ATTEMPTS = 3
+# fetch_engine = executors: tasks use the token the driver held when they were
+# scheduled. Conversations they could not fetch because it expired are fetched
+# again with a new token, up to this many waves in total.
+AUTH_WAVES = 3
+
+RUN_MODE = dbutils.widgets.get("run_mode")
+SHARD_COUNT = int(dbutils.widgets.get("shard_count")) if RUN_MODE != "single" else 1
+SHARD_INDEX = int(dbutils.widgets.get("shard_index")) if RUN_MODE == "shard" else 0
+# Key of a run in genie_crawl_runs.shard: runs only resume or abandon runs with the same key
+SHARD_KEY = {"single": "all", "shard": f"{SHARD_INDEX}/{SHARD_COUNT}", "finalize": "finalize"}[RUN_MODE]
+if RUN_MODE == "shard" and not 0 <= SHARD_INDEX < SHARD_COUNT:
+    raise ValueError(f"shard_index must be in [0, {SHARD_COUNT}), got {SHARD_INDEX}")
+SPACE_IDS = [s.strip() for s in dbutils.widgets.get("space_ids").split(",") if s.strip()]
+
+def in_shard(space_id: str) -> bool:
+    # crc32 rather than hash(): str hashes are salted per Python process
+    return RUN_MODE != "shard" or zlib.crc32(space_id.encode()) % SHARD_COUNT == SHARD_INDEX
+
+# User dimension cache: found users are re-read after USER_TTL_DAYS, ids that
+# are not users (e.g. service principals) after NOT_FOUND_TTL_DAYS, and lookups
+# that errored after ERROR_TTL_DAYS.
+USER_TTL_DAYS = 7
+NOT_FOUND_TTL_DAYS = 30
+ERROR_TTL_DAYS = 1
+SCIM_BATCH_SIZE = 50  # ids per SCIM filter query
+
+# HyperLogLog sketch size for the mergeable unique-user rollups. lgConfigK = 12
+# keeps 4096 registers per sketch: ~1.6% relative standard error.
+HLL_LG_CONFIG_K = 12
+
+# Payloads are landed in bronze every FLUSH_ROWS rows, so driver memory stays
+# flat no matter how many messages a workspace has.
+FLUSH_ROWS = 5000
+BRONZE_RETENTION_DAYS = 7
+
+# Silver tables are liquid-clustered for the time-windowed gold queries, and
+# compacted with OPTIMIZE once this many files were written since the last one.
+CLUSTER_COLUMNS = ["created_timestamp", "space_id"]
+OPTIMIZE_MIN_NEW_FILES = 200
+
+RUN_STARTED = time.monotonic()
+
+# A stand-in accepts any bearer token
+w = WorkspaceClient(host=API_HOST, token="standin") if API_HOST else WorkspaceClient()
 
 spark.sql(f"CREATE CATALOG IF NOT EXISTS {CATALOG}")
 spark.sql(f"USE CATALOG {CATALOG}")
 spark.sql(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
 spark.sql(f"USE {SCHEMA}")
 
+def ensure_columns(table: str, columns: Dict[str, str]) -> None:
+    # Add columns introduced after a table was first created
+    existing = set(spark.table(table).columns)
+    missing = [f"{name} {dtype}" for name, dtype in columns.items() if name not in existing]
+    if missing:
+        spark.sql(f"ALTER TABLE {table} ADD COLUMNS ({', '.join(missing)})")
+
+def ensure_deletion_vectors(table: str) -> None:
+    # Row-level concurrency: MERGEs from parallel shard tasks that touch
+    # different rows no longer conflict. Only altered once, since a metadata
+    # change itself conflicts with every concurrent writer.
+    props = {r["key"]: r["value"] for r in spark.sql(f"SHOW TBLPROPERTIES {table}").collect()}
+    if props.get("delta.enableDeletionVectors") != "true":
+        spark.sql(f"ALTER TABLE {table} SET TBLPROPERTIES ('delta.enableDeletionVectors' = true)")
+
+# High-water marks of the last successful run.
+# scope = 'space':        id = space_id, watermarks over the space's conversations
+# scope = 'conversation': id = conversation_id, watermarks over its messages
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+  scope STRING,
+  id STRING,
+  space_id STRING,
+  created_watermark TIMESTAMP,
+  updated_watermark TIMESTAMP,
+  checkpointed_at TIMESTAMP
+) USING DELTA
+""")
+
+# Raw API payloads, appended in micro-batches as they are fetched
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {CONV_BRONZE_TABLE} (
+  run_id STRING,
+  batch_id INT,
+  space_id STRING,
+  payload_json STRING,
+  ingested_at TIMESTAMP
+) USING DELTA
+""")
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {MSG_BRONZE_TABLE} (
+  run_id STRING,
+  batch_id INT,
+  space_id STRING,
+  conversation_id STRING,
+  payload_json STRING,
+  error STRING,
+  ingested_at TIMESTAMP
+) USING DELTA
+""")
+
+# Crawl state. A run stays 'running' until its watermarks are advanced (a
+# shard run is 'landed' once its payloads are in bronze, until the finalize
+# task merges it); the progress table records, per conversation, the page to
+# resume from (or 'done'), and conversations whose fetch keeps failing collect
+# in the dead-letter table with their last error.
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {CRAWL_RUNS_TABLE} (
+  run_id STRING,
+  ingest_mode STRING,
+  status STRING,
+  started_at TIMESTAMP,
+  conversations_listed_at TIMESTAMP,
+  finished_at TIMESTAMP
+) USING DELTA
+""")
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {CRAWL_PROGRESS_TABLE} (
+  run_id STRING,
+  space_id STRING,
+  conversation_id STRING,
+  status STRING,
+  next_page_token STRING,
+  updated_at TIMESTAMP
+) USING DELTA
+""")
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {DEAD_LETTER_TABLE} (
+  space_id STRING,
+  conversation_id STRING,
+  attempts INT,
+  last_error STRING,
+  first_failed_at TIMESTAMP,
+  last_failed_at TIMESTAMP,
+  last_run_id STRING
+) USING DELTA
+""")
+ensure_columns(CRAWL_RUNS_TABLE, {"shard": "STRING"})
+for table in (CRAWL_RUNS_TABLE, CRAWL_PROGRESS_TABLE, DEAD_LETTER_TABLE):
+    ensure_deletion_vectors(table)
+
+# One row per stage of every run, appended as each stage finishes
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {INGESTION_RUNS_TABLE} (
+  run_id STRING,
+  stage STRING,
+  ingest_mode STRING,
+  fetch_engine STRING,
+  http_engine STRING,
+  started_at TIMESTAMP,
+  ended_at TIMESTAMP,
+  seconds DOUBLE,
+  api_requests BIGINT,
+  pages_fetched BIGINT,
+  throttled BIGINT,
+  retried BIGINT,
+  failed BIGINT,
+  rows BIGINT,
+  merge_inserted BIGINT,
+  merge_updated BIGINT,
+  peak_rss_mb DOUBLE
+) USING DELTA
+""")
+
+# Reusing an unfinished run's id makes the bronze rows it already landed part
+# of this run, so only the remaining work is fetched again. A shard run that
+# landed but was never finalized is picked up too; the finalize task has no
+# fetch state of its own and always starts over.
+same_shard = (F.coalesce("shard", F.lit("all")) == SHARD_KEY) & (F.col("ingest_mode") == INGEST_MODE)
+resumable = ["running", "landed"] if RUN_MODE == "shard" else ["running"]
+unfinished = (spark.table(CRAWL_RUNS_TABLE)
+    .where(same_shard & F.col("status").isin(resumable))
+    .orderBy(F.desc("started_at")).first())
+if RESUME_RUN and RUN_MODE != "finalize" and unfinished is not None:
+    RUN_ID = unfinished["run_id"]
+    CONVERSATIONS_LISTED = unfinished["conversations_listed_at"] is not None
+    spark.sql(f"UPDATE {CRAWL_RUNS_TABLE} SET status = 'running' WHERE run_id = '{RUN_ID}'")
+    print(f"Resuming run {RUN_ID} ({SHARD_KEY}) started at {unfinished['started_at']}")
+else:
+    spark.sql(f"""
+    UPDATE {CRAWL_RUNS_TABLE} SET status = 'abandoned', finished_at = current_timestamp()
+    WHERE status IN ({', '.join(f"'{s}'" for s in resumable)})
+      AND COALESCE(shard, 'all') = '{SHARD_KEY}'
+    """)
+    RUN_ID = uuid.uuid4().hex
+    CONVERSATIONS_LISTED = RUN_MODE == "finalize"
+    spark.sql(f"""
+    INSERT INTO {CRAWL_RUNS_TABLE} (run_id, ingest_mode, status, started_at, conversations_listed_at, finished_at, shard)
+    VALUES ('{RUN_ID}', '{INGEST_MODE}', 'running', current_timestamp(), NULL, NULL, '{SHARD_KEY}')
+    """)
+
+# Runs whose landed payloads this task merges: its own, or in finalize mode
+# the latest landed run of every shard
+RUN_IDS = [RUN_ID]
+if RUN_MODE == "finalize":
+    # Exactly the shards of this shard_count: runs left landed by another
+    # configuration (e.g. "3/14" when shard_count is 4) are never merged
+    expected_shards = [f"{i}/{SHARD_COUNT}" for i in range(SHARD_COUNT)]
+    shard_runs = (spark.table(CRAWL_RUNS_TABLE)
+        .where((F.col("status") == "landed") & (F.col("ingest_mode") == INGEST_MODE)
+               & F.col("shard").isin(expected_shards))
+        .orderBy(F.desc("started_at")).collect())
+    latest = {}
+    for r in shard_runs:
+        latest.setdefault(r["shard"], r["run_id"])
+    missing = [shard for shard in expected_shards if shard not in latest]
+    if missing:
+        raise RuntimeError(f"Shards {missing} have no landed run to finalize")
+    RUN_IDS = list(latest.values())
+    print(f"Finalizing {SHARD_COUNT} shard runs: {RUN_IDS}")
+
 
 # COMMAND ----------
 
-# DBTITLE 1,REST API Helpers
-def _paged_get(path: str, items_key: str) -> Iterable[Dict]:
-    page_token = None
-    while True:
-        q = {"page_size": PAGE_SIZE}
-        if page_token:
-            q["page_token"] = page_token
-        resp = api.do("GET", path, query=q)
-        items = resp.get(items_key, [])
-        for it in items:
-            yield it
-        page_token = resp.get("next_page_token")
-        if not page_token:
-            break
+# MAGIC %run ./genie_api_client
 
-def list_spaces() -> List[Dict]:
-    # GET /api/2.0/genie/spaces  (List Genie spaces)
-    # Docs: https://docs.databricks.com/api/workspace/genie/listspaces
-    return list(_paged_get("/api/2.0/genie/spaces", "spaces"))
+# COMMAND ----------
 
-def list_conversations(space_id: str) -> List[Dict]:
-    # GET /api/2.0/genie/spaces/{space_id}/conversations  (include_all across users)
-    # Docs: https://docs.databricks.com/api/workspace/genie/listconversations
-    return list(_paged_get(f"/api/2.0/genie/spaces/{space_id}/conversations?include_all=true", "conversations"))
+# MAGIC %run ./genie_payloads
 
-def list_conversation_messages(space_id: str, conversation_id: str) -> List[Dict]:
-    # GET /api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages
-    # Docs: https://docs.databricks.com/api/workspace/genie/listconversationmessages
-    return list(_paged_get(f"/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages", "messages"))
+# COMMAND ----------
+
+# DBTITLE 1,Bronze landing helpers
+def land_batches(records: Iterable[Tuple], schema: T.StructType, table: str,
+                 on_flush: Optional[Callable[[List[Tuple]], None]] = None) -> int:
+    # Append records to a bronze table in micro-batches of FLUSH_ROWS, tagged
+    # with this run's id. PageLanded/FetchFailed markers mixed into records are
+    # passed to on_flush once every row before them has been written. Returns
+    # the number of rows landed.
+    landed, batch_ids = 0, itertools.count()
+    batch, markers = [], []
+
+    def flush():
+        nonlocal landed, batch, markers
+        if batch:
+            (spark.createDataFrame(batch, schema=schema)
+                .select(F.lit(RUN_ID).alias("run_id"), F.lit(next(batch_ids)).alias("batch_id"), "*",
+                        F.current_timestamp().alias("ingested_at"))
+                .write.mode("append").saveAsTable(table))
+            landed += len(batch)
+        if markers and on_flush:
+            on_flush(markers)
+        batch, markers = [], []
+
+    for rec in records:
+        if isinstance(rec, (PageLanded, FetchFailed)):
+            markers.append(rec)
+            continue
+        batch.append(rec)
+        if len(batch) >= FLUSH_ROWS:
+            flush()
+    flush()
+    return landed
+
+def landed(table: str):
+    return spark.table(table).where(F.col("run_id").isin(RUN_IDS)).drop("run_id", "batch_id")
 
 
 # COMMAND ----------
 
+# DBTITLE 1,Stage metrics
+# Wall time, API calls, rows, MERGE counts and the driver memory high-water
+# mark of each stage. Every stage is appended to ingestion_runs as it ends, so
+# a failed run still shows how far it got; the full list is also returned to
+# the caller with dbutils.notebook.exit at the end of the run.
+stage_metrics: List[Dict] = []
+_stage: Dict = {}
+
+def _merge_totals() -> Tuple[int, int]:
+    # merge_stats is filled by merge_changed (table helpers below)
+    return (sum(st["inserted"] for st in merge_stats.values()),
+            sum(st["updated"] for st in merge_stats.values()))
+
+def begin_stage(name: str) -> None:
+    _stage.clear()
+    _stage.update(name=name, started=time.monotonic(), started_at=datetime.now(timezone.utc),
+                  api=dict(api_stats), merges=_merge_totals())
+
+def end_stage(rows: int = 0) -> None:
+    seconds = time.monotonic() - _stage["started"]
+    calls = {k: api_stats[k] - _stage["api"][k] for k in api_stats}
+    inserted, updated = (now - then for now, then in zip(_merge_totals(), _stage["merges"]))
+    m = {
+        "stage": _stage["name"], "seconds": round(seconds, 3), "rows": rows, **calls,
+        "merge_inserted": inserted, "merge_updated": updated,
+        "requests_per_s": round(calls["requests"] / seconds, 2) if seconds else 0.0,
+        "rows_per_s": round(rows / seconds, 2) if seconds else 0.0,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    stage_metrics.append(m)
+    spark.createDataFrame([(
+        RUN_ID, m["stage"], INGEST_MODE, FETCH_ENGINE, HTTP_ENGINE,
+        _stage["started_at"], datetime.now(timezone.utc), float(m["seconds"]),
+        m["requests"], m["pages"], m["throttled"], m["retried"], m["failed"],
+        rows, inserted, updated, m["peak_rss_mb"],
+    )], spark.table(INGESTION_RUNS_TABLE).schema).write.mode("append").saveAsTable(INGESTION_RUNS_TABLE)
+
+# COMMAND ----------
+
+# DBTITLE 1,Table helpers
+def ensure_clustering(table: str, cols: List[str]) -> None:
+    # Tables created before liquid clustering are PARTITIONED BY (space_id),
+    # which cannot be altered in place: rewrite them once with CLUSTER BY.
+    detail = spark.sql(f"DESCRIBE DETAIL {table}").first().asDict()
+    if list(detail.get("clusteringColumns") or []) == cols:
+        return
+    if detail["partitionColumns"]:
+        print(f"Migrating {table} from PARTITIONED BY {detail['partitionColumns']} to CLUSTER BY {cols}")
+        spark.sql(f"CREATE OR REPLACE TABLE {table} CLUSTER BY ({', '.join(cols)}) AS SELECT * FROM {table}")
+    else:
+        spark.sql(f"ALTER TABLE {table} CLUSTER BY ({', '.join(cols)})")
+
+def files_written_since_optimize(table: str) -> int:
+    # Files added by appends and MERGEs since the last OPTIMIZE, read from the
+    # Delta history. These are the small files incremental runs leave behind.
+    written = 0
+    for h in spark.sql(f"DESCRIBE HISTORY {table} LIMIT 500").select("operation", "operationMetrics").collect():
+        if h["operation"] == "OPTIMIZE":
+            break
+        m = h["operationMetrics"] or {}
+        written += int(m.get("numTargetFilesAdded") or m.get("numFiles") or m.get("numAddedFiles") or 0)
+    return written
+
+def content_hash(*cols: str):
+    # Fingerprint of the columns a MERGE may change; ingested_at is left out so
+    # a re-fetched, byte-identical row hashes the same.
+    return F.sha2(F.concat_ws("\x1f", *[F.coalesce(F.col(c).cast("string"), F.lit("")) for c in cols]), 256)
+
+# Running inserted/updated/unchanged totals per MERGE target for this run
+merge_stats: Dict[str, Dict[str, int]] = {}
+
+def merge_changed(target: str, source_view: str, key: str) -> Dict[str, int]:
+    # Upsert source_view into target, rewriting only rows whose content_hash
+    # changed. Returns and records inserted/updated/unchanged row counts.
+    source_rows = spark.table(source_view).count()
+    m = spark.sql(f"""
+    MERGE INTO {target} t
+    USING {source_view} s
+    ON t.{key} = s.{key}
+    WHEN MATCHED AND NOT (t.content_hash <=> s.content_hash) THEN UPDATE SET *
+    WHEN NOT MATCHED THEN INSERT *
+    """).first()
+    st = {"inserted": int(m["num_inserted_rows"]), "updated": int(m["num_updated_rows"])}
+    st["unchanged"] = source_rows - st["inserted"] - st["updated"]
+    totals = merge_stats.setdefault(target, {"inserted": 0, "updated": 0, "unchanged": 0})
+    for k, v in st.items():
+        totals[k] += v
+    print(f"{target}: {st['inserted']} inserted, {st['updated']} updated, {st['unchanged']} unchanged")
+    return st
+
+# COMMAND ----------
+
 # DBTITLE 1,Ingest Spaces data
-spaces = list_spaces()
+begin_stage("spaces")
+spaces = [s for s in list_spaces() if not SPACE_IDS or s.get("space_id") in SPACE_IDS]
 
 spaces_df = spark.createDataFrame(
     [(json.dumps(s),) for s in spaces],
     schema=T.StructType([T.StructField("payload_json", T.StringType(), False)])
 ).withColumn("ingested_at", F.current_timestamp()) \
- .withColumn("space_id", F.get_json_object("payload_json", "$.space_id")) \
- .withColumn("title",    F.get_json_object("payload_json", "$.title")) \
- .withColumn("description", F.get_json_object("payload_json", "$.description")) \
- .withColumn("warehouse_id", F.get_json_object("payload_json", "$.warehouse_id"))
+ .withColumn("p", F.from_json("payload_json", SPACE_PAYLOAD_SCHEMA)) \
+ .select("p.*", "payload_json", "ingested_at")
 
 spark.sql(f"""
 CREATE TABLE IF NOT EXISTS {SPACES_TABLE} (
@@ -110,156 +490,345 @@ CREATE TABLE IF NOT EXISTS {SPACES_TABLE} (
   ingested_at TIMESTAMP
 ) USING DELTA
 """)
+ensure_columns(SPACES_TABLE, {"content_hash": "STRING"})
 
 spaces_df.select("space_id","title","description","warehouse_id","payload_json","ingested_at") \
+    .withColumn("content_hash", content_hash("payload_json")) \
     .dropna(subset=["space_id"]) \
     .dropDuplicates(["space_id"]) \
     .createOrReplaceTempView("_spaces_incoming")
 
-spark.sql(f"""
-MERGE INTO {SPACES_TABLE} t
-USING _spaces_incoming s
-ON t.space_id = s.space_id
-WHEN MATCHED THEN UPDATE SET *
-WHEN NOT MATCHED THEN INSERT *
-""")
+# Shards only land payloads: the silver MERGEs run once, in the finalize task
+if RUN_MODE != "shard":
+    merge_changed(SPACES_TABLE, "_spaces_incoming", "space_id")
+end_stage(rows=len(spaces))
 
 
 # COMMAND ----------
 
 # DBTITLE 1,Ingest Conversation data
-all_convs = []
-
-# space id's for testing. Remove for PROD
-space_ids = [
-    {"space_id": "01f08d8be94b1fec8bde6037d5eaf022"},
-    {"space_id": "01f0892583d31d2da542584ff87dcf62"},
-    {"space_id": "01f08799e3b3163984675dd16cd34c8e"},
-]
-
-for s in space_ids: # replace spaces with space_ids for TEST
-    sid = s.get("space_id")
-    if not sid: 
-        continue
-    convs = list_conversations(sid)  # include_all=true
-    for c in convs:
-        all_convs.append((sid, json.dumps(c)))
-    time.sleep(THROTTLE_S)
-
-convs_df = spark.createDataFrame(
-    all_convs,
-    schema=T.StructType([
+begin_stage("conversations")
+# A shard lists only its own spaces
+space_work = [(s["space_id"],) for s in spaces if s.get("space_id") and in_shard(s["space_id"])]
+conv_rows = 0
+# A resumed run already landed the complete listing; finalize merges the shards' listings
+if not CONVERSATIONS_LISTED:
+    conv_records = (
+        (sid, json.dumps(c))
+        for (sid,), convs in fan_out(list_conversations, space_work)  # include_all=true
+        for c in convs
+    )
+    conv_rows = land_batches(conv_records, T.StructType([
         T.StructField("space_id", T.StringType(), False),
         T.StructField("payload_json", T.StringType(), False),
-    ])
-).withColumn("ingested_at", F.current_timestamp())
+    ]), CONV_BRONZE_TABLE)
+    spark.sql(f"UPDATE {CRAWL_RUNS_TABLE} SET conversations_listed_at = current_timestamp() WHERE run_id = '{RUN_ID}'")
+
+convs_df = landed(CONV_BRONZE_TABLE)
 
 # Flatten common fields from conversation payload
 convs_flat = (convs_df
-  .withColumn("conversation_id", F.get_json_object("payload_json", "$.conversation_id"))
-  .withColumn("title", F.get_json_object("payload_json", "$.title"))
-  .withColumn("created_timestamp", F.from_unixtime((F.get_json_object("payload_json", "$.created_timestamp"))/1000))
+  .withColumn("p", F.from_json("payload_json", CONV_PAYLOAD_SCHEMA))
   .select(
-      "space_id","conversation_id","title",
-      "created_timestamp","ingested_at","payload_json"
+      "space_id", "p.conversation_id", "p.title",
+      epoch_ms_to_ts(F.col("p.created_timestamp")).alias("created_timestamp"),
+      epoch_ms_to_ts(F.col("p.last_updated_timestamp")).alias("last_updated_timestamp"),
+      "ingested_at", "payload_json",
   )
+  .withColumn("activity_ts", F.coalesce("last_updated_timestamp", "created_timestamp"))
   .dropna(subset=["conversation_id"])
   .dropDuplicates(["conversation_id"])
 )
 
-spark.sql(f"""
-CREATE TABLE IF NOT EXISTS {CONV_TABLE} (
-  space_id STRING,
-  conversation_id STRING,
-  title STRING,
-  created_timestamp TIMESTAMP,
-  ingested_at TIMESTAMP,
-  payload_json STRING
-) USING DELTA
-PARTITIONED BY (space_id)
-""")
+# Shards leave the conversations MERGE (and any one-off table rewrite) to finalize
+if RUN_MODE != "shard":
+    spark.sql(f"""
+    CREATE TABLE IF NOT EXISTS {CONV_TABLE} (
+      space_id STRING,
+      conversation_id STRING,
+      title STRING,
+      created_timestamp TIMESTAMP,
+      ingested_at TIMESTAMP,
+      payload_json STRING
+    ) USING DELTA
+    CLUSTER BY (created_timestamp, space_id)
+    """)
+    ensure_columns(CONV_TABLE, {"content_hash": "STRING"})
+    ensure_clustering(CONV_TABLE, CLUSTER_COLUMNS)
+
+    convs_flat.select(
+        "space_id","conversation_id","title",
+        "created_timestamp","ingested_at","payload_json"
+    ).withColumn("content_hash", content_hash("payload_json")) \
+     .createOrReplaceTempView("_convs_incoming")
+    merge_changed(CONV_TABLE, "_convs_incoming", "conversation_id")
+end_stage(rows=conv_rows)
 
-convs_flat.createOrReplaceTempView("_convs_incoming")
-spark.sql(f"""
-MERGE INTO {CONV_TABLE} t
-USING _convs_incoming s
-ON t.conversation_id = s.conversation_id
-WHEN MATCHED THEN UPDATE SET *
-WHEN NOT MATCHED THEN INSERT *
-""")
 
+# COMMAND ----------
+
+# DBTITLE 1,Select conversations to fetch
+def checkpoints(scope: str):
+    return spark.table(CHECKPOINT_TABLE).where(F.col("scope") == scope)
+
+if INGEST_MODE == "full":
+    # Backfill: every conversation ever stored. A shard has not merged its
+    # listing yet: its stored conversations plus the ones it just listed.
+    stored = (spark.table(CONV_TABLE) if spark.catalog.tableExists(CONV_TABLE) else convs_flat) \
+        .select("space_id", "conversation_id", "created_timestamp")
+    if RUN_MODE == "shard":
+        stored = (stored.where(F.col("space_id").isin([sid for sid, in space_work]))
+            .unionByName(convs_flat.select("space_id", "conversation_id", "created_timestamp"))
+            .dropDuplicates(["conversation_id"]))
+    to_fetch = stored.withColumn("activity_ts", F.col("created_timestamp"))
+else:
+    space_cp = checkpoints("space").select(
+        F.col("id").alias("space_id"), F.col("created_watermark").alias("space_created_wm"))
+    conv_cp = checkpoints("conversation").select(
+        F.col("id").alias("conversation_id"), F.col("updated_watermark").alias("conv_updated_wm"))
+    recent = F.col("created_timestamp") >= F.expr(f"current_timestamp() - INTERVAL {REFETCH_WINDOW_DAYS} DAYS")
+    to_fetch = (convs_flat
+        .join(space_cp, "space_id", "left")
+        .join(conv_cp, "conversation_id", "left")
+        .where(
+            F.col("conv_updated_wm").isNull()                                           # never fetched
+            | (F.col("created_timestamp") > F.col("space_created_wm"))                  # new since last run
+            | (F.col("activity_ts") > F.col("conv_updated_wm"))                         # updated since last run
+            | (F.col("last_updated_timestamp").isNull() & recent)                       # no update signal
+        )
+        .select("space_id", "conversation_id", "created_timestamp", "activity_ts"))
+
+# Park conversations that keep failing, then skip what this run (when resumed)
+# already finished and carry over the page to continue from.
+parked = (spark.table(DEAD_LETTER_TABLE)
+    .where(F.col("attempts") >= DEAD_LETTER_MAX_ATTEMPTS).select("conversation_id"))
+run_progress = (spark.table(CRAWL_PROGRESS_TABLE)
+    .where(F.col("run_id").isin(RUN_IDS)).select("conversation_id", "status", "next_page_token"))
+to_fetch = to_fetch.join(parked, "conversation_id", "left_anti").cache()
+pending = (to_fetch
+    .join(run_progress, "conversation_id", "left")
+    .where(F.col("status").isNull() | (F.col("status") != "done"))
+    .select("space_id", "conversation_id", "next_page_token"))
+print(f"{INGEST_MODE} mode: {to_fetch.count()} conversations selected, {pending.count()} left to fetch, {parked.count()} parked")
 
 # COMMAND ----------
 
 # DBTITLE 1,Ingest messages data
-conv_ids = [r["conversation_id"] for r in spark.table(CONV_TABLE).select("conversation_id").collect()]
-space_by_conv = {r["conversation_id"]: r["space_id"] for r in spark.table(CONV_TABLE).select("conversation_id","space_id").collect()}
-
-rows = []
-for cid in conv_ids:
-    sid = space_by_conv[cid]
-    msgs = list_conversation_messages(sid, cid)
-    for m in msgs:
-        rows.append((sid, cid, json.dumps(m)))
-    time.sleep(THROTTLE_S)
-
-msgs_df = spark.createDataFrame(
-    rows,
-    schema=T.StructType([
-        T.StructField("space_id", T.StringType(), False),
-        T.StructField("conversation_id", T.StringType(), False),
-        T.StructField("payload_json", T.StringType(), False),
-    ])
-).withColumn("ingested_at", F.current_timestamp())
-
-# Flatten common message fields
+msg_record_schema = T.StructType([
+    T.StructField("space_id", T.StringType(), False),
+    T.StructField("conversation_id", T.StringType(), False),
+    T.StructField("payload_json", T.StringType(), True),
+    T.StructField("error", T.StringType(), True),
+])
+ensure_columns(MSG_BRONZE_TABLE, {"error": "STRING"})
+begin_stage("messages_fetch")
+
+def record_dead_letters(failed) -> None:
+    # failed: DataFrame of (space_id, conversation_id, error)
+    failed.createOrReplaceTempView("_failed_incoming")
+    spark.sql(f"""
+    MERGE INTO {DEAD_LETTER_TABLE} t
+    USING (SELECT *, current_timestamp() AS failed_at FROM _failed_incoming) s
+    ON t.conversation_id = s.conversation_id
+    WHEN MATCHED THEN UPDATE SET
+      attempts = t.attempts + 1, last_error = s.error, last_failed_at = s.failed_at, last_run_id = '{RUN_ID}'
+    WHEN NOT MATCHED THEN INSERT
+      (space_id, conversation_id, attempts, last_error, first_failed_at, last_failed_at, last_run_id)
+      VALUES (s.space_id, s.conversation_id, 1, s.error, s.failed_at, s.failed_at, '{RUN_ID}')
+    """)
+
+def record_progress(progress) -> None:
+    # progress: DataFrame of (space_id, conversation_id, next_page_token); a
+    # null token means the conversation is done
+    progress.createOrReplaceTempView("_progress_incoming")
+    spark.sql(f"""
+    MERGE INTO {CRAWL_PROGRESS_TABLE} t
+    USING (
+      SELECT '{RUN_ID}' AS run_id, space_id, conversation_id,
+             IF(next_page_token IS NULL, 'done', 'in_progress') AS status,
+             next_page_token, current_timestamp() AS updated_at
+      FROM _progress_incoming
+    ) s
+    ON t.run_id = s.run_id AND t.conversation_id = s.conversation_id
+    WHEN MATCHED THEN UPDATE SET *
+    WHEN NOT MATCHED THEN INSERT *
+    """)
+
+def checkpoint_pages(markers: List[Tuple]) -> None:
+    # on_flush for land_batches: keep the latest page per conversation
+    latest = {m.conversation_id: m for m in markers if isinstance(m, PageLanded)}
+    if latest:
+        record_progress(spark.createDataFrame(
+            [(m.space_id, m.conversation_id, m.next_page_token) for m in latest.values()],
+            "space_id STRING, conversation_id STRING, next_page_token STRING"))
+    failed = [(m.space_id, m.conversation_id, m.error) for m in markers if isinstance(m, FetchFailed)]
+    if failed:
+        record_dead_letters(spark.createDataFrame(failed, "space_id STRING, conversation_id STRING, error STRING"))
+
+if RUN_MODE == "finalize":
+    # The shard tasks fetched everything; conversations they failed on are
+    # retried by the next run
+    msg_rows = landed(MSG_BRONZE_TABLE).where(F.col("error").isNull()).count()
+elif FETCH_ENGINE == "executors":
+    # One task per core; each gets an equal share of the API rate limit
+    n_tasks = spark.sparkContext.defaultParallelism
+    host, rate = w.config.host, MAX_RPS / n_tasks
+    acc = {k: spark.sparkContext.accumulator(0) for k in api_stats}
+    run_rows = spark.table(MSG_BRONZE_TABLE).where(F.col("run_id") == RUN_ID)
+    auth_expired = F.col("error").startswith("AuthExpired")
+    # Every wave sends the tasks newly authenticated headers. A task whose
+    # token is rejected returns the rest of its conversations as AuthExpired
+    # rows, and the next wave fetches those again from their first page.
+    wave_pending = pending
+    # Batches of earlier attempts of a resumed run are not this attempt's outcome
+    first_batch_base = run_rows.select(F.coalesce(F.max("batch_id") + 1, F.lit(0))).first()[0]
+    for wave in range(AUTH_WAVES):
+        batch_base = run_rows.select(F.coalesce(F.max("batch_id") + 1, F.lit(0))).first()[0]
+        headers = w.config.authenticate()
+        fetched = (wave_pending
+            .repartition(n_tasks)
+            .rdd.mapPartitions(lambda rows, headers=headers: fetch_messages_partition(rows, host, headers, rate, acc)))
+        (spark.createDataFrame(fetched, schema=msg_record_schema)
+            .select(F.lit(RUN_ID).alias("run_id"), (F.spark_partition_id() + batch_base).alias("batch_id"), "*",
+                    F.current_timestamp().alias("ingested_at"))
+            .write.mode("append").saveAsTable(MSG_BRONZE_TABLE))
+        wave_pending = (run_rows
+            .where(F.col("batch_id").between(batch_base, batch_base + n_tasks - 1) & auth_expired)
+            .select("space_id", "conversation_id", F.lit(None).cast("string").alias("next_page_token"))
+            .dropDuplicates(["conversation_id"]))
+        expired = wave_pending.count()
+        if not expired:
+            break
+        print(f"Wave {wave + 1}: the token expired for {expired} conversations")
+    for k, a in acc.items():
+        api_stats[k] += a.value
+    # Tasks report failures as error rows. A conversation failed if the last
+    # batch this attempt wrote for it has one: an AuthExpired row is followed by
+    # a later batch when the next wave fetched it again, and a failure mid-way
+    # shares its batch with the pages before it. Everything else is done; a
+    # failed conversation is fetched again from its first page.
+    attempt_rows = run_rows.where(F.col("batch_id") >= first_batch_base)
+    last_batch = attempt_rows.groupBy("conversation_id").agg(F.max("batch_id").alias("batch_id"))
+    failed = (attempt_rows
+        .join(last_batch, ["conversation_id", "batch_id"])
+        .where(F.col("error").isNotNull())
+        .select("space_id", "conversation_id", "error")
+        .dropDuplicates(["conversation_id"]))
+    record_dead_letters(failed)
+    record_progress(pending.join(failed, "conversation_id", "left_anti")
+        .select("space_id", "conversation_id", F.lit(None).cast("string").alias("next_page_token")))
+    msg_rows = landed(MSG_BRONZE_TABLE).where(F.col("error").isNull()).count()
+else:
+    work = ((r["space_id"], r["conversation_id"], r["next_page_token"]) for r in pending.toLocalIterator())
+
+    def msg_records():
+        for (sid, cid, _), (pages, error) in fan_out(fetch_message_pages, work):
+            for msgs, nxt in pages:
+                for m in msgs:
+                    yield (sid, cid, json.dumps(m), None)
+                yield PageLanded(sid, cid, nxt)
+            if error:
+                yield FetchFailed(sid, cid, error)
+
+    msg_rows = land_batches(msg_records(), msg_record_schema, MSG_BRONZE_TABLE, on_flush=checkpoint_pages)
+end_stage(rows=msg_rows)
+
+msgs_df = landed(MSG_BRONZE_TABLE).where(F.col("error").isNull()).drop("error")
+
+# Flatten message fields from a single parse of each payload
 messages_flat = (
-    msgs_df
-    .withColumn("message_id", F.get_json_object("payload_json", "$.message_id"))
-    .withColumn("author_id", F.get_json_object("payload_json", "$.user_id"))
-    .withColumn("created_timestamp",
-        F.from_unixtime((F.get_json_object("payload_json", "$.created_timestamp"))/1000)
-    )
-    .withColumn("last_updated_timestamp",
-        F.from_unixtime((F.get_json_object("payload_json", "$.last_updated_timestamp"))/1000)
-    )
-    .withColumn("content", F.get_json_object("payload_json", "$.content"))
-    .select(
-        "space_id","conversation_id","message_id","author_id",
-        "created_timestamp", "last_updated_timestamp", "content", "ingested_at", "payload_json"
-    )
+    parse_message_payloads(msgs_df)
+    .select("space_id", "conversation_id", *message_columns(), "ingested_at", "payload_json")
     .dropna(subset=["message_id"])
     .dropDuplicates(["message_id"])
 )
 
+# COMMAND ----------
+
+# DBTITLE 1,Shard runs stop after landing their payloads
+if RUN_MODE == "shard":
+    spark.sql(f"UPDATE {CRAWL_RUNS_TABLE} SET status = 'landed', finished_at = current_timestamp() WHERE run_id = '{RUN_ID}'")
+    to_fetch.unpersist()
+    if async_http is not None:
+        async_http.close()
+    print(f"Shard {SHARD_KEY} landed {conv_rows} conversations and {msg_rows} messages from {len(space_work)} spaces")
+    dbutils.notebook.exit(json.dumps({"run_id": RUN_ID, "wall_s": round(time.monotonic() - RUN_STARTED, 3),
+                                      "stages": stage_metrics}))
+
 
 # COMMAND ----------
 
 # DBTITLE 1,Get User Details
-ids = [r["author_id"] for r in messages_flat.select("author_id").distinct().collect()]
+begin_stage("users")
+# lookup_status: 'found', 'not_found' or 'error'. Misses are cached too, so
+# unknown ids are not looked up again on every run.
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {USERS_TABLE} (
+  user_id STRING,
+  display_name STRING,
+  user_email STRING,
+  active BOOLEAN,
+  lookup_status STRING,
+  refreshed_at TIMESTAMP
+) USING DELTA
+""")
 
-def get_user_details(uid):
+expired = F.expr(f"""
+  u.refreshed_at < current_timestamp() - make_dt_interval(CASE u.lookup_status
+    WHEN 'found' THEN {USER_TTL_DAYS}
+    WHEN 'not_found' THEN {NOT_FOUND_TTL_DAYS}
+    ELSE {ERROR_TTL_DAYS} END)
+""")
+stale_ids = [r["author_id"] for r in (messages_flat
+    .select("author_id").dropna().distinct().alias("m")
+    .join(spark.table(USERS_TABLE).alias("u"), F.col("m.author_id") == F.col("u.user_id"), "left")
+    .where(F.col("u.user_id").isNull() | expired)
+    .select("m.author_id")
+    .collect())]
+
+def lookup_users(batch: List[str]) -> List[Tuple]:
+    # One SCIM query per batch: id eq "a" or id eq "b" ...
+    scim_filter = " or ".join(f'id eq "{uid}"' for uid in batch)
     try:
-        u = w.users.get(uid)
-        return (u.id, getattr(u, "display_name", None), getattr(u, "user_name", None), getattr(u, "active", None))
+        found = {u.id: u for u in w.users.list(filter=scim_filter, attributes="id,displayName,userName,active")}
     except Exception:
-        return None
-
-user_id_list = [get_user_details(uid) for uid in ids]
-
-lookup_df = spark.createDataFrame(
-    user_id_list,
-    schema=T.StructType([
+        return [(uid, None, None, None, "error") for uid in batch]
+    return [
+        (uid, found[uid].display_name, found[uid].user_name, found[uid].active, "found") if uid in found
+        else (uid, None, None, None, "not_found")
+        for uid in batch
+    ]
+
+batches = [(stale_ids[i:i + SCIM_BATCH_SIZE],) for i in range(0, len(stale_ids), SCIM_BATCH_SIZE)]
+user_rows = [row for _, rows in fan_out(lookup_users, batches) for row in rows]
+print(f"Looked up {len(stale_ids)} new or expired user ids in {len(batches)} SCIM queries")
+
+if user_rows:
+    (spark.createDataFrame(user_rows, schema=T.StructType([
         T.StructField("user_id", T.StringType()),
         T.StructField("display_name", T.StringType()),
         T.StructField("user_email", T.StringType()),
         T.StructField("active", T.BooleanType()),
-    ])
-)
+        T.StructField("lookup_status", T.StringType()),
+    ])).withColumn("refreshed_at", F.current_timestamp())
+       .createOrReplaceTempView("_users_incoming"))
+    # A transient error never overwrites a previously found user
+    spark.sql(f"""
+    MERGE INTO {USERS_TABLE} t
+    USING _users_incoming s
+    ON t.user_id = s.user_id
+    WHEN MATCHED AND s.lookup_status = 'error' AND t.lookup_status = 'found' THEN UPDATE SET refreshed_at = s.refreshed_at
+    WHEN MATCHED THEN UPDATE SET *
+    WHEN NOT MATCHED THEN INSERT *
+    """)
+
+lookup_df = spark.table(USERS_TABLE).where(F.col("lookup_status") == "found")
+end_stage(rows=len(stale_ids))
 lookup_df.display()
 
 # COMMAND ----------
 
+begin_stage("messages_merge")
 df_enriched = (
     messages_flat.alias("m")
     .join(
@@ -279,11 +848,27 @@ df_enriched = (
         "created_timestamp",
         "last_updated_timestamp",
         "content",
+        "status",
+        "attachments",
+        "query_statement_id",
+        "query_row_count",
+        "error_type",
         "ingested_at",
         "payload_json"
     )
+    .withColumn("content_hash", content_hash("payload_json", "author_name", "author_email"))
+    .drop("payload_json")  # kept in MSG_RAW_TABLE, out of the hot table
 )
 
+MSG_TYPED_COLUMNS = {
+    "status": "STRING",
+    "attachments": f"ARRAY<STRUCT<{' '.join(ATTACHMENT_SCHEMA.split())}>>",
+    "query_statement_id": "STRING",
+    "query_row_count": "BIGINT",
+    "error_type": "STRING",
+    "content_hash": "STRING",
+}
+
 spark.sql(
     f"""
 CREATE TABLE IF NOT EXISTS {MSG_TABLE} (
@@ -296,30 +881,317 @@ CREATE TABLE IF NOT EXISTS {MSG_TABLE} (
   created_timestamp TIMESTAMP,
   last_updated_timestamp TIMESTAMP,
   content STRING,
-  ingested_at TIMESTAMP,
-  payload_json STRING
+  ingested_at TIMESTAMP
 ) USING DELTA
-PARTITIONED BY (space_id)
+CLUSTER BY (created_timestamp, space_id)
 """
 )
+ensure_columns(MSG_TABLE, MSG_TYPED_COLUMNS)
+ensure_clustering(MSG_TABLE, CLUSTER_COLUMNS)
+
+# Raw message payloads live in their own table keyed by message_id, so scans
+# and joins of the hot table never drag the largest column through I/O.
+# zstd compresses JSON text far better than the default snappy; as a table
+# property it also applies to files rewritten by OPTIMIZE.
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {MSG_RAW_TABLE} (
+  message_id STRING,
+  space_id STRING,
+  conversation_id STRING,
+  payload_json STRING,
+  content_hash STRING,
+  ingested_at TIMESTAMP
+) USING DELTA
+TBLPROPERTIES ('delta.parquet.compression.codec' = 'zstd')
+""")
+raw_props = {r["key"]: r["value"] for r in spark.sql(f"SHOW TBLPROPERTIES {MSG_RAW_TABLE}").collect()}
+if raw_props.get("delta.parquet.compression.codec") != "zstd":
+    spark.sql(f"ALTER TABLE {MSG_RAW_TABLE} SET TBLPROPERTIES ('delta.parquet.compression.codec' = 'zstd')")
+
+def backfill_typed_columns() -> None:
+    # Typed columns added to an existing table start out NULL, and messages
+    # whose payload did not change are never merged again. Fill them once from
+    # the stored payloads: payload_json while this table still has it (it is
+    # dropped below), otherwise the raw table it was moved to.
+    props = {r["key"]: r["value"] for r in spark.sql(f"SHOW TBLPROPERTIES {MSG_TABLE}").collect()}
+    if props.get("genie.typedColumnsBackfilled") == "true":
+        return
+    source = MSG_TABLE if "payload_json" in spark.table(MSG_TABLE).columns else MSG_RAW_TABLE
+    print(f"Backfilling typed columns of {MSG_TABLE} from {source}")
+    (parse_message_payloads(spark.table(source).where(F.col("payload_json").isNotNull()))
+        .select("message_id", *typed_message_fields())
+        .dropDuplicates(["message_id"])
+        .createOrReplaceTempView("_typed_backfill"))
+    cols = ["status", "attachments", "query_statement_id", "query_row_count", "error_type"]
+    spark.sql(f"""
+    MERGE INTO {MSG_TABLE} t
+    USING _typed_backfill s
+    ON t.message_id = s.message_id
+    WHEN MATCHED AND ({" OR ".join(f"t.{c} IS NULL" for c in cols)}) THEN UPDATE SET
+      {", ".join(f"{c} = COALESCE(t.{c}, s.{c})" for c in cols)}
+    """)
+    spark.sql(f"ALTER TABLE {MSG_TABLE} SET TBLPROPERTIES ('genie.typedColumnsBackfilled' = 'true')")
+
+def move_payloads_to_raw() -> None:
+    # genie_messages tables from before the split still carry payload_json:
+    # copy it to the raw table once, then drop and purge it from the hot table.
+    if "payload_json" not in spark.table(MSG_TABLE).columns:
+        return
+    print(f"Moving payload_json from {MSG_TABLE} to {MSG_RAW_TABLE}")
+    (spark.table(MSG_TABLE)
+        .where(F.col("payload_json").isNotNull())
+        .select("message_id", "space_id", "conversation_id", "payload_json",
+                content_hash("payload_json").alias("content_hash"), "ingested_at")
+        .createOrReplaceTempView("_raw_backfill"))
+    merge_changed(MSG_RAW_TABLE, "_raw_backfill", "message_id")
+    # Column mapping upgrades the protocol as far as it needs. Pinning the
+    # versions would downgrade tables that liquid clustering already upgraded.
+    spark.sql(f"ALTER TABLE {MSG_TABLE} SET TBLPROPERTIES ('delta.columnMapping.mode' = 'name')")
+    spark.sql(f"ALTER TABLE {MSG_TABLE} DROP COLUMN payload_json")
+    spark.sql(f"REORG TABLE {MSG_TABLE} APPLY (PURGE)")
+
+backfill_typed_columns()
+move_payloads_to_raw()
+
+(messages_flat
+    .select("message_id", "space_id", "conversation_id", "payload_json",
+            content_hash("payload_json").alias("content_hash"), "ingested_at")
+    .createOrReplaceTempView("_raw_incoming"))
+merge_changed(MSG_RAW_TABLE, "_raw_incoming", "message_id")
 
 df_enriched.createOrReplaceTempView("_msgs_incoming")
-spark.sql(
-    f"""
-MERGE INTO {MSG_TABLE} t
-USING _msgs_incoming s
-ON t.message_id = s.message_id
-WHEN MATCHED THEN UPDATE SET *
-WHEN NOT MATCHED THEN INSERT *
-"""
-)
+msg_merge = merge_changed(MSG_TABLE, "_msgs_incoming", "message_id")
+end_stage(rows=msg_merge["inserted"] + msg_merge["updated"])
 
 display(spark.table(MSG_TABLE).orderBy(F.desc("created_timestamp")).limit(20))
 
 # COMMAND ----------
 
+# DBTITLE 1,Days touched by this run
+# Day buckets whose gold aggregates can change: days of new or updated
+# conversations and of every message landed in this run. Collected while
+# to_fetch is still cached; the gold refresh recomputes only these days.
+touched_days = sorted(
+    r["day"] for r in (to_fetch.select(F.to_date("created_timestamp").alias("day"))
+        .union(messages_flat.select(F.to_date("created_timestamp").alias("day")))
+        .dropna().distinct().collect())
+)
+print(f"{len(touched_days)} day buckets touched")
+
+# Conversations whose facts can change: every selected conversation, including
+# those that have no messages yet, and every conversation with landed messages.
+# Collected now because to_fetch reads the checkpoints advanced below.
+touched_conversation_ids = [] if INGEST_MODE == "full" else [
+    r["conversation_id"] for r in (to_fetch.select("conversation_id")
+        .union(messages_flat.select("conversation_id"))
+        .distinct().collect())
+]
+
+# COMMAND ----------
+
+# DBTITLE 1,Advance ingestion watermarks
+begin_stage("watermarks")
+# Only reached once messages are merged, so a failed run leaves the previous
+# watermarks in place and the next run retries the same conversations.
+msg_wm = (messages_flat
+    .groupBy("conversation_id")
+    .agg(F.max(F.coalesce("last_updated_timestamp", "created_timestamp")).alias("msg_wm")))
+
+# Conversations that failed keep their old watermark and are retried next run
+done_ids = (spark.table(CRAWL_PROGRESS_TABLE)
+    .where(F.col("run_id").isin(RUN_IDS) & (F.col("status") == "done")).select("conversation_id"))
+
+conv_wm = (to_fetch
+    .join(done_ids, "conversation_id", "left_semi")
+    .join(msg_wm, "conversation_id", "left")
+    .select(
+        F.lit("conversation").alias("scope"),
+        F.col("conversation_id").alias("id"),
+        "space_id",
+        F.col("created_timestamp").alias("created_watermark"),
+        F.greatest("activity_ts", "msg_wm").alias("updated_watermark"),
+    ))
+
+space_wm = (convs_flat
+    .groupBy("space_id")
+    .agg(F.max("created_timestamp").alias("created_watermark"),
+         F.max("activity_ts").alias("updated_watermark"))
+    .select(F.lit("space").alias("scope"), F.col("space_id").alias("id"), "space_id",
+            "created_watermark", "updated_watermark"))
+
+(conv_wm.unionByName(space_wm)
+    .withColumn("checkpointed_at", F.current_timestamp())
+    .createOrReplaceTempView("_checkpoints_incoming"))
+
+spark.sql(f"""
+MERGE INTO {CHECKPOINT_TABLE} t
+USING _checkpoints_incoming s
+ON t.scope = s.scope AND t.id = s.id
+WHEN MATCHED THEN UPDATE SET
+  created_watermark = greatest(t.created_watermark, s.created_watermark),
+  updated_watermark = greatest(t.updated_watermark, s.updated_watermark),
+  checkpointed_at = s.checkpointed_at
+WHEN NOT MATCHED THEN INSERT *
+""")
+to_fetch.unpersist()
+
+# Conversations that went through clear their dead-letter entry
+done_ids.createOrReplaceTempView("_done_ids")
+spark.sql(f"MERGE INTO {DEAD_LETTER_TABLE} t USING _done_ids s ON t.conversation_id = s.conversation_id WHEN MATCHED THEN DELETE")
+run_id_list = ", ".join(f"'{r}'" for r in set(RUN_IDS + [RUN_ID]))
+spark.sql(f"UPDATE {CRAWL_RUNS_TABLE} SET status = 'succeeded', finished_at = current_timestamp() WHERE run_id IN ({run_id_list})")
+spark.sql(f"DELETE FROM {CRAWL_PROGRESS_TABLE} WHERE run_id NOT IN (SELECT run_id FROM {CRAWL_RUNS_TABLE} WHERE status IN ('running', 'landed'))")
+
+# Old bronze rows of runs that can still be resumed or finalized are kept:
+# their progress rows already count those messages as fetched
+for table in (CONV_BRONZE_TABLE, MSG_BRONZE_TABLE):
+    spark.sql(f"""
+    DELETE FROM {table}
+    WHERE ingested_at < current_timestamp() - INTERVAL {BRONZE_RETENTION_DAYS} DAYS
+      AND run_id NOT IN (SELECT run_id FROM {CRAWL_RUNS_TABLE} WHERE status IN ('running', 'landed'))
+    """)
+end_stage()
+
+# COMMAND ----------
+
+# DBTITLE 1,Compact small files
+begin_stage("compaction")
+# OPTIMIZE only when enough small files have piled up since the last one;
+# on clustered tables it also reclusters the new data.
+for table in (CONV_TABLE, MSG_TABLE, MSG_RAW_TABLE, CONV_BRONZE_TABLE, MSG_BRONZE_TABLE):
+    new_files = files_written_since_optimize(table)
+    if new_files >= OPTIMIZE_MIN_NEW_FILES:
+        print(f"OPTIMIZE {table}: {new_files} files written since last OPTIMIZE")
+        spark.sql(f"OPTIMIZE {table}")
+    else:
+        print(f"Skip OPTIMIZE {table}: {new_files} < {OPTIMIZE_MIN_NEW_FILES} new files")
+end_stage()
+
+# COMMAND ----------
+
 # MAGIC %md
-# MAGIC ## Create Gold Tables for Dashboard 
+# MAGIC ## Create Gold Tables for Dashboard
+# MAGIC
+# MAGIC Gold tables are derived from persistent daily fact tables. Each run recomputes only the day buckets touched by newly ingested rows (all days with `ingest_mode = full`), so the refresh cost follows the size of the new data rather than the full history.
+
+# COMMAND ----------
+
+# DBTITLE 1,Refresh daily fact tables
+begin_stage("fact_refresh")
+# Each fact table is keyed by day and holds exact per-day aggregates. Touched
+# days are replaced atomically with INSERT ... REPLACE WHERE; a missing fact
+# table or ingest_mode = full rebuilds it from all history.
+DAILY_FACTS = {
+    # conversations started per space, day and hour
+    "f_daily_conversations": """
+        SELECT space_id, DATE(created_timestamp) AS day, HOUR(created_timestamp) AS hour_of_day,
+               COUNT(*) AS conversations
+        FROM genie_conversations
+        WHERE {days}
+        GROUP BY 1, 2, 3
+    """,
+    # distinct message authors per space and day
+    "f_daily_space_creators": """
+        SELECT space_id, DATE(created_timestamp) AS day, COUNT(DISTINCT author_id) AS unique_creators
+        FROM genie_messages
+        WHERE {days}
+        GROUP BY 1, 2
+    """,
+    # distinct (author, conversation) pairs per space and day
+    "f_daily_user_conversations": """
+        SELECT DISTINCT space_id, DATE(created_timestamp) AS day, author_id, author_name, conversation_id
+        FROM genie_messages
+        WHERE {days}
+    """,
+    # mergeable HyperLogLog sketches of message authors per space and day.
+    # Unique users over any date range and set of spaces:
+    #   hll_sketch_estimate(hll_union_agg(author_sketch))
+    "f_daily_space_user_sketches": f"""
+        SELECT space_id, DATE(created_timestamp) AS day,
+               hll_sketch_agg(author_id, {HLL_LG_CONFIG_K}) AS author_sketch
+        FROM genie_messages
+        WHERE {{days}}
+        GROUP BY 1, 2
+    """,
+    # distinct message authors across all spaces per day
+    "f_daily_active_users": """
+        SELECT DATE(created_timestamp) AS day, COUNT(DISTINCT author_id) AS dau
+        FROM genie_messages
+        WHERE {days}
+        GROUP BY 1
+    """,
+}
+
+all_days = "created_timestamp IS NOT NULL"
+day_list = ", ".join(f"DATE'{d}'" for d in touched_days)
+# The range bounds let Delta skip files outside the touched days
+touched_filter = touched_days and (
+    f"created_timestamp >= TIMESTAMP'{touched_days[0]}' "
+    f"AND created_timestamp < TIMESTAMP'{touched_days[-1]}' + INTERVAL 1 DAY "
+    f"AND DATE(created_timestamp) IN ({day_list})"
+)
+
+for table, select in DAILY_FACTS.items():
+    if INGEST_MODE == "full" or not spark.catalog.tableExists(table):
+        spark.sql(f"CREATE OR REPLACE TABLE {table} USING DELTA AS {select.format(days=all_days)}")
+    elif touched_days:
+        spark.sql(f"INSERT INTO {table} REPLACE WHERE day IN ({day_list}) "
+                  f"{select.format(days=touched_filter)}")
+
+# COMMAND ----------
+
+# DBTITLE 1,Refresh conversation facts
+# One row per conversation with its message and turn counts, time span and
+# authors, read by the dashboard as is. Only the conversations this run
+# touched are recomputed (from all of their messages) and merged, so new
+# conversations without messages get a row with messages = 0 as in a rebuild.
+CONVERSATION_FACTS_SELECT = """
+    SELECT
+      c.conversation_id,
+      c.space_id,
+      c.title,
+      c.created_timestamp,
+      COUNT(m.message_id) AS messages,
+      COUNT_IF(m.status = 'COMPLETED') AS turns,
+      MIN(m.created_timestamp) AS first_msg_ts,
+      MAX(m.created_timestamp) AS last_msg_ts,
+      (UNIX_TIMESTAMP(MAX(m.created_timestamp)) - UNIX_TIMESTAMP(MIN(m.created_timestamp))) / 60.0 AS duration_min,
+      ARRAY_SORT(COLLECT_SET(m.author_name)) AS authors,
+      current_timestamp() AS refreshed_at
+    FROM genie_conversations c
+    LEFT JOIN genie_messages m ON m.conversation_id = c.conversation_id
+    WHERE {conversations}
+    GROUP BY c.conversation_id, c.space_id, c.title, c.created_timestamp
+"""
+
+if INGEST_MODE == "full" or not spark.catalog.tableExists(CONVERSATION_FACTS_TABLE):
+    spark.sql(f"""
+    CREATE OR REPLACE TABLE {CONVERSATION_FACTS_TABLE}
+    CLUSTER BY ({", ".join(CLUSTER_COLUMNS)})
+    AS {CONVERSATION_FACTS_SELECT.format(conversations="true")}
+    """)
+    touched_conversations = spark.table(CONVERSATION_FACTS_TABLE).count()
+else:
+    spark.createDataFrame([(cid,) for cid in touched_conversation_ids], "conversation_id STRING") \
+        .createOrReplaceTempView("_touched_conversations")
+    m = spark.sql(f"""
+    MERGE INTO {CONVERSATION_FACTS_TABLE} t
+    USING ({CONVERSATION_FACTS_SELECT.format(
+        conversations="c.conversation_id IN (SELECT conversation_id FROM _touched_conversations)")}) s
+    ON t.conversation_id = s.conversation_id
+    WHEN MATCHED THEN UPDATE SET *
+    WHEN NOT MATCHED THEN INSERT *
+    """).first()
+    touched_conversations = int(m["num_inserted_rows"]) + int(m["num_updated_rows"])
+print(f"{CONVERSATION_FACTS_TABLE}: {touched_conversations} conversations refreshed")
+
+# Superseded by conversation_facts
+spark.sql("DROP TABLE IF EXISTS f_daily_conversation_messages")
+spark.sql("DROP TABLE IF EXISTS g_messages_per_conversation_90d")
+end_stage(rows=len(touched_days) + touched_conversations)
+
+# The gold_tables stage covers the gold SQL cells below and ends in the run summary
+begin_stage("gold_tables")
 
 # COMMAND ----------
 
@@ -334,13 +1206,13 @@ display(spark.table(MSG_TABLE).orderBy(F.desc("created_timestamp")).limit(20))
 # MAGIC -- Total conversations by day (last 90d)
 # MAGIC CREATE OR REPLACE TABLE g_conv_last_90d AS
 # MAGIC SELECT
-# MAGIC   c.space_id, 
+# MAGIC   f.space_id,
 # MAGIC   s.title,
-# MAGIC   DATE_TRUNC('day', c.created_timestamp) AS day,
-# MAGIC   COUNT(c.conversation_id) AS conversations
-# MAGIC FROM genie_conversations c
-# MAGIC JOIN genie_spaces s on c.space_id = s.space_id
-# MAGIC WHERE c.created_timestamp >= DATEADD(day, -90, CURRENT_TIMESTAMP())
+# MAGIC   CAST(f.day AS TIMESTAMP) AS day,
+# MAGIC   SUM(f.conversations) AS conversations
+# MAGIC FROM f_daily_conversations f
+# MAGIC JOIN genie_spaces s on f.space_id = s.space_id
+# MAGIC WHERE f.day >= DATE_SUB(CURRENT_DATE(), 90)
 # MAGIC GROUP BY 1,2,3
 # MAGIC ORDER BY 1;
 
@@ -351,14 +1223,13 @@ display(spark.table(MSG_TABLE).orderBy(F.desc("created_timestamp")).limit(20))
 # MAGIC -- Daily unique users (by creator) last 90d
 # MAGIC CREATE OR REPLACE TABLE g_daily_unique_creators_last_90d AS
 # MAGIC SELECT
-# MAGIC   m.space_id,     
+# MAGIC   f.space_id,
 # MAGIC   s.title,
-# MAGIC   DATE_TRUNC('day', m.created_timestamp) AS day,
-# MAGIC   COUNT(DISTINCT author_id) AS unique_creators
-# MAGIC FROM genie_messages m
-# MAGIC JOIN genie_spaces s on m.space_id = s.space_id
-# MAGIC WHERE m.created_timestamp >= DATEADD(day, -90, CURRENT_TIMESTAMP())
-# MAGIC GROUP BY 1,2,3
+# MAGIC   CAST(f.day AS TIMESTAMP) AS day,
+# MAGIC   f.unique_creators
+# MAGIC FROM f_daily_space_creators f
+# MAGIC JOIN genie_spaces s on f.space_id = s.space_id
+# MAGIC WHERE f.day >= DATE_SUB(CURRENT_DATE(), 90)
 # MAGIC ORDER BY 1;
 
 # COMMAND ----------
@@ -368,51 +1239,30 @@ display(spark.table(MSG_TABLE).orderBy(F.desc("created_timestamp")).limit(20))
 # MAGIC -- Top users by conversations (last 90d)
 # MAGIC CREATE OR REPLACE TABLE g_top_creators_90d AS
 # MAGIC SELECT
-# MAGIC   m.space_id,     
+# MAGIC   f.space_id,
 # MAGIC   s.title,
-# MAGIC   m.author_name AS user,
-# MAGIC   COUNT(DISTINCT conversation_id) AS conversation_count
-# MAGIC FROM genie_messages m
-# MAGIC JOIN genie_spaces s on m.space_id = s.space_id
-# MAGIC WHERE m.created_timestamp >= DATEADD(day, -90, CURRENT_TIMESTAMP())
+# MAGIC   f.author_name AS user,
+# MAGIC   COUNT(DISTINCT f.conversation_id) AS conversation_count
+# MAGIC FROM f_daily_user_conversations f
+# MAGIC JOIN genie_spaces s on f.space_id = s.space_id
+# MAGIC WHERE f.day >= DATE_SUB(CURRENT_DATE(), 90)
 # MAGIC GROUP BY 1,2,3
 # MAGIC ORDER BY 4 DESC;
 
 # COMMAND ----------
 
-# DBTITLE 1,Messages per conversation (last 90d)
-# MAGIC %sql
-# MAGIC -- Messages per conversation (last 90d)
-# MAGIC CREATE OR REPLACE TABLE g_messages_per_conversation_90d AS
-# MAGIC SELECT
-# MAGIC   c.conversation_id,
-# MAGIC   c.title AS title,
-# MAGIC   m.author_name AS user,
-# MAGIC   COUNT(m.message_id) AS messages,
-# MAGIC   MIN(m.created_timestamp) AS first_msg_ts,
-# MAGIC   MAX(m.created_timestamp) AS last_msg_ts,
-# MAGIC   (UNIX_TIMESTAMP(MAX(m.created_timestamp)) - UNIX_TIMESTAMP(MIN(m.created_timestamp))) / 60.0 AS duration_min
-# MAGIC FROM genie_conversations c
-# MAGIC LEFT JOIN genie_messages m
-# MAGIC   ON m.conversation_id = c.conversation_id
-# MAGIC WHERE c.created_timestamp >= DATEADD(day, -30, CURRENT_TIMESTAMP())
-# MAGIC GROUP BY c.conversation_id, c.title, m.author_name
-# MAGIC ORDER BY duration_min DESC;
-
-# COMMAND ----------
-
 # DBTITLE 1,Conversation start hour histogram (last 90d)
 # MAGIC %sql
 # MAGIC -- Conversation start hour histogram (last 90d)
 # MAGIC CREATE OR REPLACE TABLE g_conversation_hour_hist_90d AS
 # MAGIC SELECT
-# MAGIC   c.space_id,
+# MAGIC   f.space_id,
 # MAGIC   s.title,
-# MAGIC   HOUR(c.created_timestamp) AS hour_of_day,
-# MAGIC   COUNT(*) AS conversations
-# MAGIC FROM genie_conversations c
-# MAGIC JOIN genie_spaces s on c.space_id = s.space_id
-# MAGIC WHERE c.created_timestamp >= DATEADD(day, -30, CURRENT_TIMESTAMP())
+# MAGIC   f.hour_of_day,
+# MAGIC   SUM(f.conversations) AS conversations
+# MAGIC FROM f_daily_conversations f
+# MAGIC JOIN genie_spaces s on f.space_id = s.space_id
+# MAGIC WHERE f.day >= DATE_SUB(CURRENT_DATE(), 30)
 # MAGIC GROUP BY 1,2,3
 # MAGIC ORDER BY 1;
 
@@ -423,13 +1273,37 @@ display(spark.table(MSG_TABLE).orderBy(F.desc("created_timestamp")).limit(20))
 # MAGIC -- Daily Active Users (last 30d)
 # MAGIC CREATE OR REPLACE TABLE ${catalog}.${schema}.g_dau_by_messages_30d AS
 # MAGIC SELECT
-# MAGIC   DATE_TRUNC('day', m.created_timestamp) AS day,
-# MAGIC   COUNT(DISTINCT m.author_id) AS dau
-# MAGIC FROM ${catalog}.${schema}.genie_messages m
-# MAGIC WHERE m.created_timestamp >= DATEADD(day, -30, CURRENT_TIMESTAMP())
-# MAGIC GROUP BY 1
+# MAGIC   CAST(f.day AS TIMESTAMP) AS day,
+# MAGIC   f.dau
+# MAGIC FROM ${catalog}.${schema}.f_daily_active_users f
+# MAGIC WHERE f.day >= DATE_SUB(CURRENT_DATE(), 30)
 # MAGIC ORDER BY 1;
 
 # COMMAND ----------
 
+# DBTITLE 1,Run summary
+end_stage()
+if async_http is not None:
+    async_http.close()
+wall_s = time.monotonic() - RUN_STARTED
+print(f"Wall time: {wall_s:.1f}s | API requests: {api_stats['requests']} | {api_stats['requests'] / wall_s:.2f} req/s "
+      f"(limit {MAX_RPS:g} req/s, final rate {rate_limiter.rate:.2f} req/s, {MAX_WORKERS} workers)")
+print(f"Throttled: {api_stats['throttled']} | Retried: {api_stats['retried']} | Failed: {api_stats['failed']}")
+dead_letters = spark.table(DEAD_LETTER_TABLE)
+print(f"Run {RUN_ID} | Dead letters: {dead_letters.count()} conversations, "
+      f"{dead_letters.where(F.col('attempts') >= DEAD_LETTER_MAX_ATTEMPTS).count()} parked")
+display(spark.createDataFrame(
+    [(table, st["inserted"], st["updated"], st["unchanged"]) for table, st in merge_stats.items()],
+    "table STRING, inserted BIGINT, updated BIGINT, unchanged BIGINT",
+))
+display(spark.createDataFrame(stage_metrics))
+
+# COMMAND ----------
+
+# DBTITLE 1,Return stage metrics to the caller
+dbutils.notebook.exit(json.dumps({"run_id": RUN_ID, "wall_s": round(time.monotonic() - RUN_STARTED, 3),
+                                  "stages": stage_metrics}))
+
+# COMMAND ----------
+
 
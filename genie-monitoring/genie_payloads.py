@@ -0,0 +1,90 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Genie API payload schemas
+# MAGIC
+# MAGIC Typed schemas for the space, conversation and message payloads of the Genie REST API, and the expressions that turn a message payload into `genie_messages` columns. Shared by `genie_metrics` and `benchmarks/json_parsing_benchmark` through `%run`, so the benchmark measures the same parse the notebook runs.
+
+# COMMAND ----------
+
+from pyspark.sql import functions as F
+from typing import List
+
+# COMMAND ----------
+
+# DBTITLE 1,Payload schemas
+# Typed schemas for the API payloads. Each payload is parsed once with
+# from_json instead of once per extracted field with get_json_object.
+# Timestamps are epoch milliseconds. Fields not listed here stay in payload_json.
+SPACE_PAYLOAD_SCHEMA = """
+  space_id STRING,
+  title STRING,
+  description STRING,
+  warehouse_id STRING
+"""
+
+CONV_PAYLOAD_SCHEMA = """
+  conversation_id STRING,
+  title STRING,
+  user_id STRING,
+  created_timestamp BIGINT,
+  last_updated_timestamp BIGINT
+"""
+
+ATTACHMENT_SCHEMA = """
+  attachment_id STRING,
+  text STRUCT<id: STRING, content: STRING>,
+  query STRUCT<
+    id: STRING,
+    title: STRING,
+    description: STRING,
+    query: STRING,
+    statement_id: STRING,
+    last_updated_timestamp: BIGINT,
+    query_result_metadata: STRUCT<row_count: BIGINT, is_truncated: BOOLEAN>
+  >
+"""
+
+MSG_PAYLOAD_SCHEMA = f"""
+  message_id STRING,
+  user_id STRING,
+  status STRING,
+  content STRING,
+  created_timestamp BIGINT,
+  last_updated_timestamp BIGINT,
+  attachments ARRAY<STRUCT<{ATTACHMENT_SCHEMA}>>,
+  query_result STRUCT<statement_id: STRING, row_count: BIGINT>,
+  error STRUCT<error: STRING, type: STRING>
+"""
+
+# The statement behind a message's answer is on its query attachment; the
+# top-level query_result is deprecated and only used when there is none
+FIRST_QUERY_ATTACHMENT = "try_element_at(filter({}.query, q -> q.statement_id IS NOT NULL), 1)"
+
+def epoch_ms_to_ts(col):
+    return (col / 1000).cast("timestamp")
+
+def parse_message_payloads(df):
+    # One from_json per payload: p is the message, q its first query attachment
+    return (df
+        .withColumn("p", F.from_json("payload_json", MSG_PAYLOAD_SCHEMA))
+        .withColumn("q", F.expr(FIRST_QUERY_ATTACHMENT.format("p.attachments"))))
+
+def typed_message_fields() -> List:
+    # Typed genie_messages columns taken from a parse_message_payloads row
+    return [
+        "p.status", "p.attachments",
+        F.coalesce("q.statement_id", "p.query_result.statement_id").alias("query_statement_id"),
+        F.coalesce("q.query_result_metadata.row_count", "p.query_result.row_count").alias("query_row_count"),
+        F.col("p.error.type").alias("error_type"),
+    ]
+
+def message_columns() -> List:
+    # Every genie_messages column taken from a parse_message_payloads row
+    return [
+        "p.message_id",
+        F.col("p.user_id").alias("author_id"),
+        epoch_ms_to_ts(F.col("p.created_timestamp")).alias("created_timestamp"),
+        epoch_ms_to_ts(F.col("p.last_updated_timestamp")).alias("last_updated_timestamp"),
+        "p.content", *typed_message_fields(),
+    ]
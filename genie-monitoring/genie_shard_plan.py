@@ -0,0 +1,21 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Genie Ingestion Shard Plan
+# MAGIC
+# MAGIC First task of the sharded ingestion job (`genie_ingest_job.json`). Publishes the shard indexes `0 .. shard_count - 1` as the `shard_indexes` task value, which the `ingest_shards` for-each task iterates over. The job's `shard_count` parameter is then the only setting that decides how many shards run, and it is the same value every shard and the finalize task read.
+
+# COMMAND ----------
+
+dbutils.widgets.text("shard_count", "1", "Shard count")
+
+# COMMAND ----------
+
+# DBTITLE 1,Publish shard indexes
+SHARD_COUNT = int(dbutils.widgets.get("shard_count"))
+if SHARD_COUNT < 1:
+    raise ValueError(f"shard_count must be at least 1, got {SHARD_COUNT}")
+
+shard_indexes = list(range(SHARD_COUNT))
+dbutils.jobs.taskValues.set(key="shard_indexes", value=shard_indexes)
+print(f"Planned {SHARD_COUNT} shards: {shard_indexes}")
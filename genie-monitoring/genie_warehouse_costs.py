@@ -0,0 +1,194 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC
+# MAGIC # Genie Warehouse Cost Facts
+# MAGIC
+# MAGIC Materializes daily serverless SQL cost per warehouse from `system.billing.usage` and `system.billing.list_prices` into `f_daily_warehouse_cost`, and attributes it to Genie spaces in `f_daily_space_cost`.
+# MAGIC
+# MAGIC Each run only recomputes usage days from the last materialized day on (minus a restatement window), so the dashboard's cost panels no longer range-join the billing system tables on every refresh.
+# MAGIC
+# MAGIC Schedule it after `genie_metrics` with the same catalog and schema: space attribution reads `genie_spaces`, `genie_conversations` and `genie_messages`.
+
+# COMMAND ----------
+
+# DBTITLE 1,User to specify catalog and schema for storing data
+dbutils.widgets.text("catalog", "renjiharold_demo", "Catalog")
+dbutils.widgets.text("schema", "genie_analytics", "Schema")
+
+# COMMAND ----------
+
+# DBTITLE 1,Config
+from pyspark.sql import functions as F
+import datetime
+
+CATALOG = dbutils.widgets.get("catalog").strip()
+SCHEMA  = dbutils.widgets.get("schema").strip()
+
+WAREHOUSE_COST_TABLE = f"{CATALOG}.{SCHEMA}.f_daily_warehouse_cost"
+SPACE_COST_TABLE     = f"{CATALOG}.{SCHEMA}.f_daily_space_cost"
+
+SQL_SKU_PATTERN = "ENTERPRISE_SERVERLESS_SQL_COMPUTE_%"
+# First run materializes this much history
+COST_BACKFILL_DAYS = 90
+# Billing records for recent days are still being delivered and corrected, so
+# the last few materialized days are recomputed on every run.
+COST_RESTATE_DAYS = 3
+
+spark.sql(f"USE CATALOG {CATALOG}")
+spark.sql(f"USE {SCHEMA}")
+
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {WAREHOUSE_COST_TABLE} (
+  usage_date DATE,
+  warehouse_id STRING,
+  warehouse_name STRING,
+  sku_name STRING,
+  dbus DECIMAL(38, 6),
+  cost_usd DECIMAL(38, 6)
+) USING DELTA
+CLUSTER BY (usage_date)
+""")
+
+# Warehouse cost split across the Genie spaces on the warehouse by their share
+# of that day's Genie query messages
+spark.sql(f"""
+CREATE TABLE IF NOT EXISTS {SPACE_COST_TABLE} (
+  usage_date DATE,
+  space_id STRING,
+  warehouse_id STRING,
+  query_messages BIGINT,
+  conversations BIGINT,
+  cost_usd DECIMAL(38, 6)
+) USING DELTA
+CLUSTER BY (usage_date)
+""")
+
+last_day = spark.table(WAREHOUSE_COST_TABLE).agg(F.max("usage_date")).first()[0]
+if last_day is None:
+    start_day = datetime.date.today() - datetime.timedelta(days=COST_BACKFILL_DAYS)
+else:
+    start_day = last_day - datetime.timedelta(days=COST_RESTATE_DAYS)
+print(f"Recomputing usage days from {start_day}")
+
+# Space costs computed by an older version of the cell below are recomputed
+# once over the whole history: version 1 missed the query messages whose
+# statement id is only on their query attachment, version 2 dropped the
+# conversations of days without query messages.
+SPACE_COST_VERSION = "3"
+space_cost_props = {r["key"]: r["value"] for r in spark.sql(f"SHOW TBLPROPERTIES {SPACE_COST_TABLE}").collect()}
+space_start_day = start_day
+if space_cost_props.get("genie.spaceCostVersion") != SPACE_COST_VERSION:
+    first_day = spark.table(WAREHOUSE_COST_TABLE).agg(F.min("usage_date")).first()[0]
+    space_start_day = min(start_day, first_day or start_day)
+    print(f"Recomputing space costs from {space_start_day}")
+
+# COMMAND ----------
+
+# DBTITLE 1,Daily cost per warehouse
+# Each price interval is expanded to the usage dates it overlaps (one day early,
+# so usage ending at midnight finds a price starting then). Usage joins it on
+# (sku_name, usage_date); the validity check on usage_end_time only applies to
+# the few rows that match, instead of a range join over the whole price list.
+price_days = (spark.table("system.billing.list_prices")
+    .where((F.col("currency_code") == "USD")
+           & F.col("sku_name").like(SQL_SKU_PATTERN)
+           & (F.col("price_end_time").isNull() | (F.col("price_end_time") >= F.lit(start_day))))
+    .select(
+        "sku_name", "price_start_time", "price_end_time",
+        F.col("pricing.effective_list.default").alias("unit_price"),
+        F.explode(F.sequence(
+            F.greatest(F.date_sub(F.to_date("price_start_time"), 1), F.lit(start_day)),
+            F.to_date(F.coalesce("price_end_time", F.current_timestamp())),
+        )).alias("usage_date"),
+    ))
+
+usage = (spark.table("system.billing.usage")
+    .where(F.col("sku_name").like(SQL_SKU_PATTERN)
+           & (F.col("usage_date") >= F.lit(start_day))
+           & F.col("usage_metadata.warehouse_id").isNotNull())
+    .select("usage_date", "sku_name", "usage_end_time", "usage_quantity",
+            F.col("usage_metadata.warehouse_id").alias("warehouse_id")))
+
+# Latest name of each warehouse
+warehouse_names = (spark.table("system.compute.warehouses")
+    .groupBy("warehouse_id")
+    .agg(F.max_by("warehouse_name", "change_time").alias("warehouse_name")))
+
+(usage
+    .join(F.broadcast(price_days), ["sku_name", "usage_date"])
+    .where((F.col("usage_end_time") >= F.col("price_start_time"))
+           & (F.col("price_end_time").isNull() | (F.col("usage_end_time") < F.col("price_end_time"))))
+    .groupBy("usage_date", "warehouse_id", "sku_name")
+    .agg(F.sum("usage_quantity").cast("decimal(38,6)").alias("dbus"),
+         F.sum(F.col("usage_quantity") * F.col("unit_price")).cast("decimal(38,6)").alias("cost_usd"))
+    .join(warehouse_names, "warehouse_id", "left")
+    .select("usage_date", "warehouse_id", "warehouse_name", "sku_name", "dbus", "cost_usd")
+    .createOrReplaceTempView("_warehouse_cost_incoming"))
+
+spark.sql(f"""
+INSERT INTO {WAREHOUSE_COST_TABLE} REPLACE WHERE usage_date >= DATE'{start_day}'
+SELECT * FROM _warehouse_cost_incoming
+""")
+
+# COMMAND ----------
+
+# DBTITLE 1,Daily cost per Genie space
+# Spaces are mapped to their current warehouse_id in genie_spaces. Warehouse
+# cost on days without Genie query messages is not attributed to any space.
+# Query messages are those with a query_statement_id, which genie_metrics
+# takes from the message's query attachment. Every space and day with new
+# conversations gets a row, with zero cost if it ran no queries, so cost per
+# conversation counts all of them.
+spark.sql(f"""
+INSERT INTO {SPACE_COST_TABLE} REPLACE WHERE usage_date >= DATE'{space_start_day}'
+WITH activity AS (
+  SELECT DATE(m.created_timestamp) AS usage_date, m.space_id, s.warehouse_id,
+         COUNT(*) AS query_messages
+  FROM genie_messages m
+  JOIN genie_spaces s ON m.space_id = s.space_id
+  WHERE m.query_statement_id IS NOT NULL
+    AND m.created_timestamp >= TIMESTAMP'{space_start_day}'
+  GROUP BY ALL
+),
+conversations AS (
+  SELECT DATE(f.created_timestamp) AS usage_date, f.space_id, s.warehouse_id, COUNT(*) AS conversations
+  FROM conversation_facts f
+  JOIN genie_spaces s ON f.space_id = s.space_id
+  WHERE f.created_timestamp >= TIMESTAMP'{space_start_day}'
+  GROUP BY ALL
+),
+space_days AS (
+  SELECT COALESCE(a.usage_date, c.usage_date) AS usage_date,
+         COALESCE(a.space_id, c.space_id) AS space_id,
+         COALESCE(a.warehouse_id, c.warehouse_id) AS warehouse_id,
+         COALESCE(a.query_messages, 0) AS query_messages,
+         COALESCE(c.conversations, 0) AS conversations
+  FROM activity a
+  FULL OUTER JOIN conversations c ON a.usage_date = c.usage_date AND a.space_id = c.space_id
+),
+warehouse_cost AS (
+  SELECT usage_date, warehouse_id, SUM(cost_usd) AS cost_usd
+  FROM {WAREHOUSE_COST_TABLE}
+  WHERE usage_date >= DATE'{space_start_day}'
+  GROUP BY ALL
+)
+SELECT
+  d.usage_date,
+  d.space_id,
+  d.warehouse_id,
+  d.query_messages,
+  d.conversations,
+  CAST(COALESCE(w.cost_usd * d.query_messages
+         / NULLIF(SUM(d.query_messages) OVER (PARTITION BY d.usage_date, d.warehouse_id), 0), 0)
+       AS DECIMAL(38, 6)) AS cost_usd
+FROM space_days d
+LEFT JOIN warehouse_cost w ON d.usage_date = w.usage_date AND d.warehouse_id = w.warehouse_id
+""")
+spark.sql(f"ALTER TABLE {SPACE_COST_TABLE} SET TBLPROPERTIES ('genie.spaceCostVersion' = '{SPACE_COST_VERSION}')")
+
+display(spark.table(SPACE_COST_TABLE)
+    .where(F.col("usage_date") >= F.date_sub(F.current_date(), 30))
+    .groupBy("space_id")
+    .agg(F.sum("cost_usd").alias("cost_usd_30d"), F.sum("conversations").alias("conversations_30d"))
+    .withColumn("cost_per_conversation_usd", F.expr("cost_usd_30d / NULLIF(conversations_30d, 0)"))
+    .orderBy(F.desc("cost_usd_30d")))